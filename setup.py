@@ -19,21 +19,23 @@ here = Path(__file__).parent.resolve()
 long_description = ""
 readme_path = here / "README.md"
 if readme_path.exists():
-    with open(readme_path, encoding="utf-8") as f:
-        long_description = f.read()
+    long_description = readme_path.read_text(encoding="utf-8")
 
 # Read requirements from requirements.txt
 requirements = []
 requirements_path = here / "requirements.txt"
 if requirements_path.exists():
-    with open(requirements_path, encoding="utf-8") as f:
-        requirements = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    requirements = [
+        line
+        for line in map(str.strip, requirements_path.read_text(encoding="utf-8").splitlines())
+        if line and line[0] != "#"
+    ]
 
 # Version information
 version = "1.0.0"
-version_file = here / "src" / "__version__.py"
+version_file = here / "src" / "koboldcpp_mcp_server" / "__version__.py"
 if version_file.exists():
-    exec(open(version_file).read())
+    exec(version_file.read_text(encoding="utf-8"))
 
 setup(
     name="koboldcpp-mcp",
@@ -88,6 +90,9 @@ setup(
             "pytest-asyncio>=0.21.0",
             "pytest-mock>=3.10.0",
             "aioresponses>=0.7.4",
+        ],
+        "performance": [
+            "uvloop>=0.17.0; sys_platform != 'win32'",
         ]
     },
     entry_points={
@@ -24,10 +24,6 @@ from .__version__ import (
     PACKAGE_DESCRIPTION,
 )
 
-from .server import MCPServer
-from .kobold_client import KoboldCppClient, KoboldCppStatus
-from .config.settings import get_settings, setup_logging
-
 __all__ = [
     "__version__",
     "__version_info__",
@@ -42,6 +38,24 @@ __all__ = [
     "setup_logging",
 ]
 
+
+def __getattr__(name):
+    """Resolve heavy public names on first access (PEP 562)
+
+    Importing the server, client, or settings modules pulls in websockets,
+    aiohttp, and pydantic, so they are only loaded when actually used.
+    """
+    if name == "MCPServer":
+        from .server import MCPServer
+        return MCPServer
+    if name in ("KoboldCppClient", "KoboldCppStatus"):
+        from . import kobold_client
+        return getattr(kobold_client, name)
+    if name in ("get_settings", "setup_logging"):
+        from .config import settings
+        return getattr(settings, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # Package metadata
 __author__ = "Brian"
 __license__ = "MIT"
@@ -0,0 +1,13 @@
+"""
+Entry point for ``python -m koboldcpp_mcp_server``
+
+Runs the CLI directly, bypassing the console-script wrapper and its
+entry-point metadata lookup.
+"""
+
+import sys
+
+from .cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
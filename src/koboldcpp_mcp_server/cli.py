@@ -7,73 +7,42 @@ including configuration validation, health checks, and server management.
 """
 
 import argparse
-import asyncio
+import copy
 import json
 import logging
 import sys
 import os
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 from .__version__ import __version__, MCP_PROTOCOL_VERSION
-from .config.settings import get_settings, setup_logging, validate_koboldcpp_connection
-from .server import MCPServer
-from .kobold_client import KoboldCppClient
 
+# Reusable pretty-printing encoder for config files written by the CLI
+_JSON_ENCODE = json.JSONEncoder(indent=2, ensure_ascii=False).encode
 
-def setup_argument_parser() -> argparse.ArgumentParser:
-    """Setup command line argument parser"""
-    parser = argparse.ArgumentParser(
-        prog="koboldcpp-mcp",
-        description="KoboldCpp MCP Server - Connect Claude Code to local KoboldCpp instances",
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
-Examples:
-  koboldcpp-mcp server                    # Start the MCP server
-  koboldcpp-mcp check                     # Check KoboldCpp connection
-  koboldcpp-mcp config validate          # Validate configuration
-  koboldcpp-mcp config show              # Show current configuration
-  koboldcpp-mcp --version                # Show version information
+# Claude Code MCP server entry written by ``config init``; the command is
+# filled in with the running interpreter
+_CLAUDE_TEMPLATE = {
+    "mcpServers": {
+        "koboldcpp": {
+            "command": "python3",
+            "args": ["-m", "koboldcpp_mcp_server", "server"],
+            "env": {
+                "KOBOLD_URL": "http://localhost:5001",
+                "LOG_LEVEL": "INFO",
+                "AUDIT_LOG": "false"
+            }
+        }
+    }
+}
 
-Environment Variables:
-  KOBOLD_URL                   KoboldCpp server URL (default: http://localhost:5001)
-  MCP_HOST                     MCP server host (default: localhost)
-  MCP_PORT                     MCP server port (default: 8765)
-  LOG_LEVEL                    Logging level (default: INFO)
-  AUDIT_LOG                    Enable audit logging (default: false)
+# Server, client, and settings modules are imported inside the command that
+# needs them (as pkgutil does with ``re``) so --help, --version, and argument
+# errors never load pydantic, aiohttp, or websockets.
 
-For detailed documentation, visit:
-https://github.com/ceponatia/koboldcpp-mcp
-        """
-    )
-    
-    # Global options
-    parser.add_argument(
-        "--version", 
-        action="version", 
-        version=f"KoboldCpp MCP Server {__version__} (MCP Protocol {MCP_PROTOCOL_VERSION})"
-    )
-    parser.add_argument(
-        "--config",
-        type=str,
-        metavar="PATH",
-        help="Path to configuration file"
-    )
-    parser.add_argument(
-        "--verbose", "-v",
-        action="store_true",
-        help="Enable verbose logging"
-    )
-    parser.add_argument(
-        "--quiet", "-q",
-        action="store_true",
-        help="Suppress non-error output"
-    )
-    
-    # Subcommands
-    subparsers = parser.add_subparsers(dest="command", help="Available commands")
-    
-    # Server command
+
+def _add_server_parser(subparsers: argparse._SubParsersAction) -> None:
+    """Add the server subcommand"""
     server_parser = subparsers.add_parser(
         "server",
         help="Start the MCP server",
@@ -97,8 +66,10 @@ https://github.com/ceponatia/koboldcpp-mcp
         metavar="URL",
         help="KoboldCpp server URL (overrides config)"
     )
-    
-    # Check command
+
+
+def _add_check_parser(subparsers: argparse._SubParsersAction) -> None:
+    """Add the check subcommand"""
     check_parser = subparsers.add_parser(
         "check",
         help="Check KoboldCpp connection",
@@ -110,8 +81,10 @@ https://github.com/ceponatia/koboldcpp-mcp
         metavar="URL",
         help="KoboldCpp server URL to check"
     )
-    
-    # Config command
+
+
+def _add_config_parser(subparsers: argparse._SubParsersAction) -> None:
+    """Add the config subcommand and its actions"""
     config_parser = subparsers.add_parser(
         "config",
         help="Configuration management",
@@ -144,22 +117,106 @@ https://github.com/ceponatia/koboldcpp-mcp
         action="store_true",
         help="Overwrite existing configuration files"
     )
+
+
+_SUBCOMMAND_BUILDERS = {
+    "server": _add_server_parser,
+    "check": _add_check_parser,
+    "config": _add_config_parser,
+}
+
+
+def _find_command(argv: List[str]) -> Optional[str]:
+    """Return the first positional argument, skipping global options"""
+    args = iter(argv)
+    for arg in args:
+        if arg == "--config":
+            next(args, None)
+        elif not arg.startswith("-"):
+            return arg
+    return None
+
+
+def setup_argument_parser(command: Optional[str] = None) -> argparse.ArgumentParser:
+    """Setup command line argument parser
+    
+    When ``command`` names a known subcommand only that subparser is built;
+    otherwise (no command, --help, or an unknown name) all of them are.
+    """
+    parser = argparse.ArgumentParser(
+        prog="koboldcpp-mcp",
+        description="KoboldCpp MCP Server - Connect Claude Code to local KoboldCpp instances",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  koboldcpp-mcp server                    # Start the MCP server
+  koboldcpp-mcp check                     # Check KoboldCpp connection
+  koboldcpp-mcp config validate          # Validate configuration
+  koboldcpp-mcp config show              # Show current configuration
+  koboldcpp-mcp --version                # Show version information
+  python -m koboldcpp_mcp_server server   # Start the server without the script wrapper
+
+Environment Variables:
+  KOBOLD_URL                   KoboldCpp server URL (default: http://localhost:5001)
+  MCP_HOST                     MCP server host (default: localhost)
+  MCP_PORT                     MCP server port (default: 8765)
+  LOG_LEVEL                    Logging level (default: INFO)
+  AUDIT_LOG                    Enable audit logging (default: false)
+
+For detailed documentation, visit:
+https://github.com/ceponatia/koboldcpp-mcp
+        """
+    )
+    
+    # Global options
+    parser.add_argument(
+        "--version", 
+        action="version", 
+        version=f"KoboldCpp MCP Server {__version__} (MCP Protocol {MCP_PROTOCOL_VERSION})"
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        metavar="PATH",
+        help="Path to configuration file"
+    )
+    parser.add_argument(
+        "--verbose", "-v",
+        action="store_true",
+        help="Enable verbose logging"
+    )
+    parser.add_argument(
+        "--quiet", "-q",
+        action="store_true",
+        help="Suppress non-error output"
+    )
+    
+    # Subcommands
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+    builders = _SUBCOMMAND_BUILDERS
+    if command in builders:
+        builders = {command: builders[command]}
+    for build in builders.values():
+        build(subparsers)
     
     return parser
 
 
 async def cmd_server(args: argparse.Namespace) -> int:
     """Start the MCP server"""
+    from .server import MCPServer
+
     try:
-        # Override settings with command line arguments
-        settings = get_settings()
-        
-        if args.host:
-            settings.mcp_server.host = args.host
-        if args.port:
-            settings.mcp_server.port = args.port
-        if args.kobold_url:
-            settings.koboldcpp.url = args.kobold_url
+        # Settings are immutable, so command line overrides are applied
+        # through the same environment variables the settings loader reads.
+        # The server subcommand is also the default, in which case its
+        # options are absent from the namespace.
+        if getattr(args, "host", None):
+            os.environ["MCP_HOST"] = args.host
+        if getattr(args, "port", None):
+            os.environ["MCP_PORT"] = str(args.port)
+        if getattr(args, "kobold_url", None):
+            os.environ["KOBOLD_URL"] = args.kobold_url
         
         server = MCPServer()
         await server.start()
@@ -175,10 +232,13 @@ async def cmd_server(args: argparse.Namespace) -> int:
 
 async def cmd_check(args: argparse.Namespace) -> int:
     """Check KoboldCpp connection"""
+    from .config.settings import get_settings, validate_koboldcpp_connection
+    from .kobold_client import KoboldCppClient
+
     try:
-        settings = get_settings()
         if args.url:
-            settings.koboldcpp.url = args.url
+            os.environ["KOBOLD_URL"] = args.url
+        settings = get_settings()
         
         # Validate configuration
         if not validate_koboldcpp_connection(settings.koboldcpp):
@@ -226,6 +286,8 @@ async def cmd_check(args: argparse.Namespace) -> int:
 
 def cmd_config_validate(args: argparse.Namespace) -> int:
     """Validate configuration"""
+    from .config.settings import get_settings, validate_koboldcpp_connection
+
     try:
         settings = get_settings()
         
@@ -260,14 +322,15 @@ def cmd_config_validate(args: argparse.Namespace) -> int:
 
 def cmd_config_show(args: argparse.Namespace) -> int:
     """Show current configuration"""
+    from .config.settings import get_settings
+
     try:
         settings = get_settings()
         
         print("Current Configuration:")
         print("=" * 50)
         
-        config_dict = settings.model_dump()
-        print(json.dumps(config_dict, indent=2))
+        print(settings.model_dump_json(indent=2))
         
         return 0
         
@@ -278,6 +341,8 @@ def cmd_config_show(args: argparse.Namespace) -> int:
 
 def cmd_config_init(args: argparse.Namespace) -> int:
     """Initialize configuration files"""
+    from .config.settings import get_settings
+
     try:
         config_dir = Path("config")
         config_dir.mkdir(exist_ok=True)
@@ -292,30 +357,18 @@ def cmd_config_init(args: argparse.Namespace) -> int:
         
         # Get default settings and save them
         settings = get_settings()
-        with open(config_file, 'w') as f:
-            json.dump(settings.model_dump(), f, indent=2)
+        config_file.write_text(settings.model_dump_json(indent=2))
         
         print(f"✅ Created configuration file: {config_file}")
         
         # Create Claude Code config template
         claude_config = config_dir / "claude_code_config.json"
-        claude_template = {
-            "mcpServers": {
-                "koboldcpp": {
-                    "command": "python3",
-                    "args": [str(Path.cwd() / "src" / "server.py")],
-                    "env": {
-                        "KOBOLD_URL": "http://localhost:5001",
-                        "LOG_LEVEL": "INFO",
-                        "AUDIT_LOG": "false"
-                    }
-                }
-            }
-        }
-        
         if not claude_config.exists() or args.overwrite:
-            with open(claude_config, 'w') as f:
-                json.dump(claude_template, f, indent=2)
+            # Launch through the current interpreter as a module so the
+            # config works regardless of the working directory
+            claude_template = copy.deepcopy(_CLAUDE_TEMPLATE)
+            claude_template["mcpServers"]["koboldcpp"]["command"] = sys.executable
+            claude_config.write_text(_JSON_ENCODE(claude_template), encoding="utf-8")
             print(f"✅ Created Claude Code config template: {claude_config}")
         
         print("\nNext steps:")
@@ -330,52 +383,87 @@ def cmd_config_init(args: argparse.Namespace) -> int:
         return 1
 
 
-async def async_main() -> int:
-    """Async main function"""
-    parser = setup_argument_parser()
-    args = parser.parse_args()
+async def async_main(args: argparse.Namespace) -> int:
+    """Run the commands that need an event loop"""
+    from .kobold_client import close_shared_sessions
+    
+    try:
+        if args.command == "check":
+            return await cmd_check(args)
+        
+        # Default to server if no command specified
+        return await cmd_server(args)
+    finally:
+        await close_shared_sessions()
+
+
+def run_config_command(args: argparse.Namespace) -> int:
+    """Run a synchronous config subcommand"""
+    if args.config_action == "validate":
+        return cmd_config_validate(args)
+    elif args.config_action == "show":
+        return cmd_config_show(args)
+    elif args.config_action == "init":
+        return cmd_config_init(args)
+    else:
+        # Show the full help, not the config-only parser built for this run
+        setup_argument_parser().print_help()
+        return 1
+
+
+def _configure_logging(args: argparse.Namespace) -> None:
+    """Configure root logging from --verbose/--quiet
     
-    # Setup logging based on verbosity
+    The chosen level is exported as LOG_LEVEL so that setup_logging(), which
+    the server later calls with the loaded settings, keeps it instead of
+    resetting to the configured level.
+    """
     if args.verbose:
-        log_level = logging.DEBUG
+        os.environ["LOG_LEVEL"] = "DEBUG"
     elif args.quiet:
-        log_level = logging.ERROR
-    else:
-        log_level = logging.INFO
+        os.environ["LOG_LEVEL"] = "ERROR"
     
+    log_level = getattr(logging, os.environ.get("LOG_LEVEL", "INFO").upper(), logging.INFO)
     logging.basicConfig(
         level=log_level,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        force=True
     )
+
+
+def install_event_loop_policy() -> None:
+    """Run asyncio on uvloop when the optional dependency is installed"""
+    if sys.platform == "win32":
+        return  # uvloop does not support Windows
     
-    # Handle config file override
-    if args.config:
-        os.environ["MCP_CONFIG_FILE"] = args.config
+    try:
+        import uvloop
+    except ImportError:
+        return
     
-    # Route to appropriate command
-    if args.command == "server":
-        return await cmd_server(args)
-    elif args.command == "check":
-        return await cmd_check(args)
-    elif args.command == "config":
-        if args.config_action == "validate":
-            return cmd_config_validate(args)
-        elif args.config_action == "show":
-            return cmd_config_show(args)
-        elif args.config_action == "init":
-            return cmd_config_init(args)
-        else:
-            parser.print_help()
-            return 1
-    else:
-        # Default to server if no command specified
-        return await cmd_server(args)
+    import asyncio
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
 
 def main() -> int:
     """Main entry point"""
+    parser = setup_argument_parser(_find_command(sys.argv[1:]))
+    args = parser.parse_args()
+    
+    _configure_logging(args)
+    
+    # Handle config file override
+    if args.config:
+        os.environ["MCP_CONFIG_FILE"] = args.config
+    
     try:
-        return asyncio.run(async_main())
+        # Config commands are synchronous and never need an event loop
+        if args.command == "config":
+            return run_config_command(args)
+        
+        import asyncio
+        install_event_loop_policy()
+        return asyncio.run(async_main(args))
     except KeyboardInterrupt:
         print("\nOperation cancelled by user")
         return 130
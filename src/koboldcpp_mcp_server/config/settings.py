@@ -6,14 +6,49 @@ and provides defaults for all configuration options.
 """
 
 import os
-import json
 import logging
-from typing import Optional, Dict, Any
+import functools
+from typing import Optional, Dict, Any, FrozenSet, Tuple
 from pathlib import Path
-from pydantic import BaseModel, Field
+import orjson
+from pydantic import BaseModel, ConfigDict, Field
 
 
-class KoboldCppConfig(BaseModel):
+# Environment variable -> (settings section, field)
+_ENV_MAPPING: Dict[str, Tuple[str, str]] = {
+    # KoboldCpp settings
+    "KOBOLD_URL": ("koboldcpp", "url"),
+    "KOBOLD_TIMEOUT": ("koboldcpp", "timeout"),
+    "KOBOLD_MAX_RETRIES": ("koboldcpp", "max_retries"),
+    
+    # MCP Server settings
+    "MCP_HOST": ("mcp_server", "host"),
+    "MCP_PORT": ("mcp_server", "port"),
+    "MCP_MAX_CONNECTIONS": ("mcp_server", "max_connections"),
+    
+    # Logging settings
+    "LOG_LEVEL": ("logging", "level"),
+    "AUDIT_LOG": ("logging", "audit_log"),
+    "AUDIT_FILE": ("logging", "audit_file"),
+    
+    # Security settings
+    "ENABLE_AUTH": ("security", "enable_auth"),
+    "AUTH_TOKEN": ("security", "auth_token"),
+    "MAX_PROMPT_LENGTH": ("security", "max_prompt_length"),
+    
+    # Performance settings
+    "MAX_CONCURRENT_REQUESTS": ("performance", "max_concurrent_requests"),
+    "MEMORY_LIMIT_MB": ("performance", "memory_limit_mb"),
+}
+_ENV_KEYS = frozenset(_ENV_MAPPING)
+
+
+class _ConfigModel(BaseModel):
+    """Base for config sections; read-only, schema built on first validation"""
+    model_config = ConfigDict(defer_build=True, frozen=True)
+
+
+class KoboldCppConfig(_ConfigModel):
     """KoboldCpp connection configuration"""
     url: str = Field(default="http://localhost:5001", description="KoboldCpp server URL")
     timeout: int = Field(default=30, description="Request timeout in seconds")
@@ -22,12 +57,13 @@ class KoboldCppConfig(BaseModel):
     
     # API endpoints
     generate_endpoint: str = Field(default="/api/v1/generate", description="Text generation endpoint")
+    stream_endpoint: str = Field(default="/api/extra/generate/stream", description="Streaming text generation endpoint")
     chat_endpoint: str = Field(default="/api/v1/chat/completions", description="Chat completion endpoint")
     model_endpoint: str = Field(default="/api/v1/model", description="Model info endpoint")
     status_endpoint: str = Field(default="/api/extra/generate/check", description="Status check endpoint")
 
 
-class MCPServerConfig(BaseModel):
+class MCPServerConfig(_ConfigModel):
     """MCP server configuration"""
     host: str = Field(default="localhost", description="Server host")
     port: int = Field(default=8765, description="Server port")
@@ -36,7 +72,7 @@ class MCPServerConfig(BaseModel):
     ping_timeout: Optional[int] = Field(default=10, description="WebSocket ping timeout")
 
 
-class LoggingConfig(BaseModel):
+class LoggingConfig(_ConfigModel):
     """Logging configuration"""
     level: str = Field(default="INFO", description="Log level")
     format: str = Field(
@@ -47,17 +83,22 @@ class LoggingConfig(BaseModel):
     audit_file: str = Field(default="audit.log", description="Audit log file path")
 
 
-class SecurityConfig(BaseModel):
+class SecurityConfig(_ConfigModel):
     """Security and compliance configuration"""
     enable_auth: bool = Field(default=False, description="Enable authentication")
     auth_token: Optional[str] = Field(default=None, description="Authentication token")
-    allowed_origins: list[str] = Field(default_factory=lambda: ["*"], description="Allowed CORS origins")
+    allowed_origins: FrozenSet[str] = Field(default=frozenset({"*"}), description="Allowed CORS origins")
     data_sanitization: bool = Field(default=True, description="Enable data sanitization")
     max_prompt_length: int = Field(default=8192, description="Maximum prompt length")
     max_response_length: int = Field(default=4096, description="Maximum response length")
+    
+    @functools.cached_property
+    def allow_all_origins(self) -> bool:
+        """Whether the wildcard origin is allowed"""
+        return "*" in self.allowed_origins
 
 
-class PerformanceConfig(BaseModel):
+class PerformanceConfig(_ConfigModel):
     """Performance and resource configuration"""
     max_concurrent_requests: int = Field(default=5, description="Maximum concurrent requests to KoboldCpp")
     request_queue_size: int = Field(default=100, description="Request queue size")
@@ -66,7 +107,7 @@ class PerformanceConfig(BaseModel):
     cache_ttl: int = Field(default=300, description="Cache TTL in seconds")
 
 
-class Settings(BaseModel):
+class Settings(_ConfigModel):
     """Complete application settings"""
     koboldcpp: KoboldCppConfig = Field(default_factory=KoboldCppConfig)
     mcp_server: MCPServerConfig = Field(default_factory=MCPServerConfig)
@@ -81,22 +122,33 @@ class SettingsManager:
     def __init__(self, config_path: Optional[str] = None):
         self.config_path = config_path or "config/mcp_server_config.json"
         self._settings: Optional[Settings] = None
+        self._cache_key: Optional[tuple] = None
+    
+    def _get_cache_key(self) -> tuple:
+        """Key identifying the config file revision and environment overrides"""
+        try:
+            mtime = os.stat(self.config_path).st_mtime_ns
+        except OSError:
+            mtime = 0
+        env = tuple(sorted((k, os.environ[k]) for k in _ENV_KEYS if k in os.environ))
+        return (self.config_path, mtime, hash(env))
     
     def load_settings(self) -> Settings:
         """Load settings from environment variables and config file"""
         if self._settings is not None:
             return self._settings
         
+        cache_key = self._get_cache_key()
+        
         # Start with defaults
         config_data = {}
         
         # Load from JSON config file if it exists
         if os.path.exists(self.config_path):
             try:
-                with open(self.config_path, 'r') as f:
-                    config_data = json.load(f)
-            except (json.JSONDecodeError, IOError) as e:
-                logging.warning(f"Failed to load config file {self.config_path}: {e}")
+                config_data = orjson.loads(Path(self.config_path).read_bytes())
+            except (orjson.JSONDecodeError, IOError) as e:
+                logging.warning("Failed to load config file %s: %s", self.config_path, e)
         
         # Override with environment variables
         env_overrides = self._get_env_overrides()
@@ -104,45 +156,19 @@ class SettingsManager:
         
         # Create and validate settings
         self._settings = Settings(**config_data)
+        self._cache_key = cache_key
         return self._settings
     
     def _get_env_overrides(self) -> Dict[str, Any]:
         """Get configuration overrides from environment variables"""
-        env_mapping = {
-            # KoboldCpp settings
-            "KOBOLD_URL": ("koboldcpp", "url"),
-            "KOBOLD_TIMEOUT": ("koboldcpp", "timeout"),
-            "KOBOLD_MAX_RETRIES": ("koboldcpp", "max_retries"),
-            
-            # MCP Server settings
-            "MCP_HOST": ("mcp_server", "host"),
-            "MCP_PORT": ("mcp_server", "port"),
-            "MCP_MAX_CONNECTIONS": ("mcp_server", "max_connections"),
-            
-            # Logging settings
-            "LOG_LEVEL": ("logging", "level"),
-            "AUDIT_LOG": ("logging", "audit_log"),
-            "AUDIT_FILE": ("logging", "audit_file"),
-            
-            # Security settings
-            "ENABLE_AUTH": ("security", "enable_auth"),
-            "AUTH_TOKEN": ("security", "auth_token"),
-            "MAX_PROMPT_LENGTH": ("security", "max_prompt_length"),
-            
-            # Performance settings
-            "MAX_CONCURRENT_REQUESTS": ("performance", "max_concurrent_requests"),
-            "MEMORY_LIMIT_MB": ("performance", "memory_limit_mb"),
-        }
-        
         overrides = {}
-        for env_var, (section, key) in env_mapping.items():
-            value = os.getenv(env_var)
-            if value is not None:
-                # Convert string values to appropriate types
-                converted_value = self._convert_env_value(value)
-                if section not in overrides:
-                    overrides[section] = {}
-                overrides[section][key] = converted_value
+        for env_var in os.environ.keys() & _ENV_MAPPING.keys():
+            section, key = _ENV_MAPPING[env_var]
+            # Convert string values to appropriate types
+            converted_value = self._convert_env_value(os.environ[env_var])
+            if section not in overrides:
+                overrides[section] = {}
+            overrides[section][key] = converted_value
         
         return overrides
     
@@ -168,25 +194,34 @@ class SettingsManager:
         return value
     
     def _merge_config(self, base: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
-        """Merge configuration dictionaries"""
-        result = base.copy()
+        """Merge override sections into ``base`` in place and return it"""
         for section, values in overrides.items():
-            if section not in result:
-                result[section] = {}
-            result[section].update(values)
-        return result
+            base.setdefault(section, {}).update(values)
+        return base
     
     def save_settings(self, settings: Settings) -> None:
         """Save settings to config file"""
         config_dir = Path(self.config_path).parent
         config_dir.mkdir(parents=True, exist_ok=True)
         
-        with open(self.config_path, 'w') as f:
-            json.dump(settings.model_dump(), f, indent=2)
+        Path(self.config_path).write_text(settings.model_dump_json(indent=2))
+        
+        # The file now holds exactly this already-validated instance, so adopt
+        # it and let reload_settings() skip re-parsing and re-validating it.
+        # Environment overrides would be layered on top at load time, so this
+        # only applies when none are set.
+        if not os.environ.keys() & _ENV_KEYS:
+            self._settings = settings
+            self._cache_key = self._get_cache_key()
+            get_settings.cache_clear()
     
     def reload_settings(self) -> Settings:
         """Reload settings from file and environment"""
+        if self._settings is not None and self._get_cache_key() == self._cache_key:
+            return self._settings
+        
         self._settings = None
+        get_settings.cache_clear()
         return self.load_settings()
 
 
@@ -194,6 +229,7 @@ class SettingsManager:
 settings_manager = SettingsManager()
 
 
+@functools.lru_cache(maxsize=1)
 def get_settings() -> Settings:
     """Get current application settings"""
     return settings_manager.load_settings()
@@ -203,17 +239,24 @@ def setup_logging(logging_config: LoggingConfig) -> None:
     """Setup logging configuration"""
     level = getattr(logging, logging_config.level.upper(), logging.INFO)
     
-    # Configure basic logging
+    # Configure basic logging, replacing any handlers installed earlier
+    # (basicConfig is otherwise a no-op once the root logger has handlers)
     logging.basicConfig(
         level=level,
         format=logging_config.format,
-        handlers=[logging.StreamHandler()]
+        handlers=[logging.StreamHandler()],
+        force=True
     )
     
     # Setup audit logging if enabled
     if logging_config.audit_log:
         audit_logger = logging.getLogger('audit')
-        audit_handler = logging.FileHandler(logging_config.audit_file)
+        for handler in audit_logger.handlers[:]:
+            audit_logger.removeHandler(handler)
+            handler.close()
+        
+        # delay=True defers opening the file until the first audit record
+        audit_handler = logging.FileHandler(logging_config.audit_file, delay=True)
         audit_handler.setFormatter(logging.Formatter(
             '%(asctime)s - AUDIT - %(message)s'
         ))
@@ -223,12 +266,9 @@ def setup_logging(logging_config: LoggingConfig) -> None:
 
 def validate_koboldcpp_connection(config: KoboldCppConfig) -> bool:
     """Validate KoboldCpp connection configuration"""
-    # Basic URL validation
-    if not config.url.startswith(('http://', 'https://')):
-        return False
-    
-    # Validate timeout and retry settings
-    if config.timeout <= 0 or config.max_retries < 0:
-        return False
-    
-    return True
\ No newline at end of file
+    url = config.url
+    return (
+        (url.startswith("http://") or url.startswith("https://"))
+        and config.timeout > 0
+        and config.max_retries >= 0
+    )
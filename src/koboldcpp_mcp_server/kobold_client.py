@@ -9,18 +9,149 @@ chat completions, and model introspection.
 import asyncio
 import aiohttp
 import logging
-from typing import Dict, List, Optional, AsyncGenerator, Any
+import orjson
+import re
+import yarl
+from typing import Dict, List, Optional, AsyncGenerator, Any, Awaitable, Callable, Tuple, cast
 from dataclasses import dataclass
-import json
 import time
 
 from .config.settings import KoboldCppConfig, get_settings
 from .protocol.message_types import (
     GenerateTextParams, ChatCompletionParams, ChatMessage,
-    ModelInfo, GenerationResult, BatchRequest, BatchResult
+    ModelInfo, GenerationChunk, GenerationResult, BatchRequest, BatchResult
 )
 
 
+# Shared HTTP sessions keyed by (base URL, timeout, event loop) so that
+# short-lived clients reuse keep-alive connections instead of reconnecting
+_SESSIONS: Dict[tuple, aiohttp.ClientSession] = {}
+
+
+def get_shared_session(config: KoboldCppConfig) -> aiohttp.ClientSession:
+    """Get the pooled keep-alive session for a KoboldCpp instance"""
+    key = (config.url.rstrip('/'), config.timeout, asyncio.get_running_loop())
+    session = _SESSIONS.get(key)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=0,
+            limit_per_host=32,
+            keepalive_timeout=75,
+            enable_cleanup_closed=True
+        )
+        session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=config.timeout),
+            connector=connector,
+            headers={"Content-Type": "application/json"}
+        )
+        _SESSIONS[key] = session
+    return session
+
+
+async def close_shared_sessions() -> None:
+    """Close all pooled sessions; call on application shutdown"""
+    sessions = list(_SESSIONS.values())
+    _SESSIONS.clear()
+    for session in sessions:
+        await session.close()
+
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per BPE token) without splitting the text"""
+    return (len(text) + 3) // 4
+
+
+# Read size for streamed responses; large blocks mean fewer loop wakeups per byte
+_STREAM_CHUNK_SIZE = 65536
+
+
+# Bytes that can change brace depth or string state while scanning JSON
+_JSON_STRUCTURE_RE = re.compile(rb'[{}"\\]')
+
+
+async def _iter_json_objects(content: aiohttp.StreamReader) -> AsyncGenerator[bytes, None]:
+    """Yield each top-level JSON object in a response body as raw bytes
+    
+    Objects are delimited by brace balance instead of by newlines, so they
+    are found regardless of line length, transfer chunk boundaries or
+    framing around them (such as server-sent "data:" prefixes). Every byte
+    is scanned once; only structural characters are visited in Python.
+    """
+    buffer = bytearray()
+    depth = 0
+    in_string = False
+    start = 0  # Offset of the open object's first brace
+    pos = 0  # Offset scanning resumes from
+    
+    async for chunk in content.iter_chunked(_STREAM_CHUNK_SIZE):
+        buffer += chunk
+        for match in _JSON_STRUCTURE_RE.finditer(buffer, pos):
+            index = match.start()
+            if index < pos:
+                continue  # Escaped by a preceding backslash
+            char = buffer[index]
+            pos = index + 1
+            if in_string:
+                if char == 0x5C:  # Backslash
+                    pos = index + 2
+                elif char == 0x22:  # Quote
+                    in_string = False
+            elif char == 0x7B:  # Open brace
+                if depth == 0:
+                    start = index
+                depth += 1
+            elif depth:
+                if char == 0x22:
+                    in_string = True
+                elif char == 0x7D:  # Close brace
+                    depth -= 1
+                    if depth == 0:
+                        yield bytes(buffer[start:pos])
+        
+        # Keep only the unfinished object, if any
+        if depth:
+            del buffer[:start]
+            pos -= start
+            start = 0
+        else:
+            buffer.clear()
+            pos = 0
+
+
+class _RetryController:
+    """Adaptive retry back-off driven by the recent failure rate
+    
+    Keeps an exponentially weighted estimate p of how often requests fail
+    and sleeps base * p / (1 - p) before a retry, capped at max_delay. A
+    server that is briefly busy is retried quickly, while sustained
+    failures push the delay up toward the cap. Each request's own attempt
+    count sets a floor of base * (attempt + 1), so the estimate being low
+    after a quiet period never shortens a request's later retries.
+    """
+    __slots__ = ("base_delay", "max_delay", "smoothing", "failure_rate")
+    
+    def __init__(self, base_delay: float, max_delay: float, smoothing: float = 0.3):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.smoothing = smoothing
+        self.failure_rate = 0.0
+    
+    def record(self, success: bool) -> None:
+        """Fold one request outcome into the failure estimate"""
+        self.failure_rate += self.smoothing * ((0.0 if success else 1.0) - self.failure_rate)
+    
+    def delay(self, attempt: int) -> float:
+        """Back-off delay in seconds before retrying after the given attempt (0-based)"""
+        p = min(self.failure_rate, 0.99)
+        adaptive = self.base_delay * p / (1.0 - p)
+        return min(self.max_delay, max(self.base_delay * (attempt + 1), adaptive))
+    
+    async def wait(self, attempt: int) -> None:
+        """Record a failed attempt and sleep before the next one"""
+        self.record(False)
+        await asyncio.sleep(self.delay(attempt))
+
+
 @dataclass
 class KoboldCppStatus:
     """KoboldCpp server status"""
@@ -34,11 +165,36 @@ class KoboldCppStatus:
 class KoboldCppClient:
     """Async client for KoboldCpp API communication"""
     
-    def __init__(self, config: Optional[KoboldCppConfig] = None):
+    # Default KoboldCpp sampler order; orjson encodes the tuple as a JSON array
+    _SAMPLER_ORDER = (6, 0, 1, 3, 4, 2, 5)
+    
+    # Fields of the native generate payload that never vary per request
+    _GENERATE_STATIC: Dict[str, Any] = {"sampler_order": _SAMPLER_ORDER}
+    
+    # Seconds a fetched ModelInfo is reused before asking KoboldCpp again
+    _MODEL_INFO_TTL = 60.0
+    
+    def __init__(self, config: Optional[KoboldCppConfig] = None, shared_session: bool = True):
         self.config = config or get_settings().koboldcpp
         self.session: Optional[aiohttp.ClientSession] = None
+        self._owns_session = not shared_session
+        
+        # Endpoint URLs are built once; aiohttp uses yarl.URL objects as-is
+        base = self.config.url.rstrip('/')
+        self._url_status = yarl.URL(base + self.config.status_endpoint, encoded=True)
+        self._url_model = yarl.URL(base + self.config.model_endpoint, encoded=True)
+        self._url_generate = yarl.URL(base + self.config.generate_endpoint, encoded=True)
+        self._url_stream = yarl.URL(base + self.config.stream_endpoint, encoded=True)
+        self._url_chat = yarl.URL(base + self.config.chat_endpoint, encoded=True)
         self.logger = logging.getLogger(__name__)
         self._request_semaphore = asyncio.Semaphore(get_settings().performance.max_concurrent_requests)
+        # Cap matches the longest delay of the old fixed exponential schedule
+        self._model_info_cache: Optional[Tuple[float, ModelInfo]] = None
+        self._model_loaded: Optional[bool] = None
+        self._retry_controller = _RetryController(
+            self.config.retry_delay,
+            self.config.retry_delay * (2 ** self.config.max_retries)
+        )
     
     async def __aenter__(self):
         """Async context manager entry"""
@@ -52,26 +208,30 @@ class KoboldCppClient:
     async def connect(self) -> None:
         """Initialize HTTP session"""
         if self.session is None:
-            timeout = aiohttp.ClientTimeout(total=self.config.timeout)
-            connector = aiohttp.TCPConnector(limit=10, limit_per_host=5)
-            self.session = aiohttp.ClientSession(
-                timeout=timeout,
-                connector=connector,
-                headers={"Content-Type": "application/json"}
-            )
-            self.logger.info(f"Connected to KoboldCpp at {self.config.url}")
+            if self._owns_session:
+                timeout = aiohttp.ClientTimeout(total=self.config.timeout)
+                connector = aiohttp.TCPConnector(limit=10, limit_per_host=5)
+                self.session = aiohttp.ClientSession(
+                    timeout=timeout,
+                    connector=connector,
+                    headers={"Content-Type": "application/json"}
+                )
+            else:
+                self.session = get_shared_session(self.config)
+            self.logger.info("Connected to KoboldCpp at %s", self.config.url)
     
     async def disconnect(self) -> None:
-        """Close HTTP session"""
+        """Release HTTP session; pooled sessions stay open for reuse"""
         if self.session:
-            await self.session.close()
+            if self._owns_session:
+                await self.session.close()
             self.session = None
             self.logger.info("Disconnected from KoboldCpp")
     
     async def _make_request(
         self,
         method: str,
-        endpoint: str,
+        url: yarl.URL,
         data: Optional[Dict[str, Any]] = None,
         retries: Optional[int] = None
     ) -> Dict[str, Any]:
@@ -79,69 +239,91 @@ class KoboldCppClient:
         if not self.session:
             await self.connect()
         
-        url = f"{self.config.url.rstrip('/')}{endpoint}"
         max_retries = retries if retries is not None else self.config.max_retries
         
+        payload = orjson.dumps(data) if data is not None else None
+        
         async with self._request_semaphore:
             for attempt in range(max_retries + 1):
                 try:
-                    async with self.session.request(method, url, json=data) as response:
-                        if response.status == 200:
-                            result = await response.json()
-                            return result
-                        elif response.status in (502, 503, 504):  # Server errors, retry
-                            if attempt < max_retries:
-                                await asyncio.sleep(self.config.retry_delay * (2 ** attempt))
-                                continue
-                        
-                        # Non-retryable error
-                        error_text = await response.text()
-                        raise aiohttp.ClientError(
-                            f"HTTP {response.status}: {error_text}"
-                        )
+                    async with self.session.request(method, url, data=payload) as response:
+                        status = response.status
+                        body = await response.read()
                 
                 except (aiohttp.ClientError, asyncio.TimeoutError) as e:
                     if attempt < max_retries:
                         self.logger.warning(
-                            f"Request failed (attempt {attempt + 1}/{max_retries + 1}): {e}"
+                            "Request failed (attempt %d/%d): %s", attempt + 1, max_retries + 1, e
                         )
-                        await asyncio.sleep(self.config.retry_delay * (2 ** attempt))
+                        await self._retry_controller.wait(attempt)
                         continue
                     raise
-        
-        raise aiohttp.ClientError(f"Failed after {max_retries + 1} attempts")
+                
+                if status == 200:
+                    self._retry_controller.record(True)
+                    try:
+                        return orjson.loads(body)
+                    except orjson.JSONDecodeError as e:
+                        # Keep callers' ClientError handling covering bad bodies
+                        raise aiohttp.ClientError(
+                            f"HTTP {status}: invalid JSON response ({e}): "
+                            f"{body[:200].decode('utf-8', errors='replace')}"
+                        ) from e
+                elif status in (502, 503, 504) and attempt < max_retries:  # Server errors, retry
+                    self.logger.warning(
+                        "Request failed (attempt %d/%d): HTTP %s", attempt + 1, max_retries + 1, status
+                    )
+                    await self._retry_controller.wait(attempt)
+                    continue
+                
+                # Non-retryable error, or retries exhausted
+                raise aiohttp.ClientError(
+                    f"HTTP {status}: {body.decode('utf-8', errors='replace')}"
+                )
     
     async def check_status(self) -> KoboldCppStatus:
         """Check KoboldCpp server status and model state"""
         try:
-            # Try to get generation status
-            status_data = await self._make_request("GET", self.config.status_endpoint)
+            # Query generation status and model info concurrently
+            status_data, model_data = await asyncio.gather(
+                self._make_request("GET", self._url_status),
+                self._make_request("GET", self._url_model),
+                return_exceptions=True
+            )
+            if isinstance(status_data, BaseException):
+                raise status_data
+            if isinstance(model_data, BaseException):
+                model_data = None  # Model endpoint might not be available
             
-            # Try to get model info
-            model_data = None
-            try:
-                model_data = await self._make_request("GET", self.config.model_endpoint)
-            except Exception:
-                pass  # Model endpoint might not be available
+            # A model was loaded or unloaded; cached model info is stale
+            model_loaded = status_data.get("ready", False)
+            if model_loaded != self._model_loaded:
+                self._model_loaded = model_loaded
+                self._model_info_cache = None
             
             return KoboldCppStatus(
                 online=True,
-                model_loaded=status_data.get("ready", False),
+                model_loaded=model_loaded,
                 model_name=model_data.get("model_name") if model_data else None,
                 context_length=model_data.get("max_context_length") if model_data else None,
                 generation_active=status_data.get("generating", False)
             )
         
         except Exception as e:
-            self.logger.error(f"Failed to check KoboldCpp status: {e}")
+            self.logger.error("Failed to check KoboldCpp status: %s", e)
             return KoboldCppStatus(online=False, model_loaded=False)
     
     async def get_model_info(self) -> ModelInfo:
-        """Get detailed model information"""
+        """Get detailed model information, cached for _MODEL_INFO_TTL seconds"""
+        if self._model_info_cache is not None:
+            fetched_at, model_info = self._model_info_cache
+            if time.monotonic() - fetched_at < self._MODEL_INFO_TTL:
+                return model_info
+        
         try:
-            data = await self._make_request("GET", self.config.model_endpoint)
+            data = await self._make_request("GET", self._url_model)
             
-            return ModelInfo(
+            model_info = ModelInfo(
                 model_name=data.get("model_name", "unknown"),
                 context_length=data.get("max_context_length", 2048),
                 vocab_size=data.get("vocab_size"),
@@ -149,17 +331,17 @@ class KoboldCppClient:
                 architecture=data.get("architecture"),
                 format=data.get("format")
             )
+            self._model_info_cache = (time.monotonic(), model_info)
+            return model_info
         
         except Exception as e:
-            self.logger.error(f"Failed to get model info: {e}")
+            self.logger.error("Failed to get model info: %s", e)
             raise
     
-    async def generate_text(self, params: GenerateTextParams) -> GenerationResult:
-        """Generate text using KoboldCpp native API"""
-        start_time = time.time()
-        
-        # Prepare request data for KoboldCpp format
-        request_data = {
+    def _generate_payload(self, params: GenerateTextParams) -> Dict[str, Any]:
+        """Build the KoboldCpp native generate request body"""
+        return {
+            **self._GENERATE_STATIC,
             "prompt": params.prompt,
             "max_context_length": params.max_tokens,
             "max_length": params.max_tokens,
@@ -169,18 +351,22 @@ class KoboldCppClient:
             "typical": params.typical_p,
             "rep_pen": params.rep_pen,
             "rep_pen_range": params.rep_pen_range,
-            "sampler_order": [6, 0, 1, 3, 4, 2, 5],  # Default KoboldCpp sampler order
             "stop_sequence": params.stop_sequence or [],
             "stream": params.stream
         }
+    
+    async def generate_text(self, params: GenerateTextParams) -> GenerationResult:
+        """Generate text using KoboldCpp native API"""
+        start_time = time.perf_counter()
+        request_data = self._generate_payload(params)
         
         try:
             # Handle non-streaming response
-            response = await self._make_request("POST", self.config.generate_endpoint, request_data)
+            response = await self._make_request("POST", self._url_generate, request_data)
             
-            generation_time = time.time() - start_time
+            generation_time = time.perf_counter() - start_time
             generated_text = response.get("results", [{}])[0].get("text", "")
-            tokens_generated = len(generated_text.split())  # Rough estimate
+            tokens_generated = _estimate_tokens(generated_text)
             
             return GenerationResult(
                 text=generated_text,
@@ -191,7 +377,43 @@ class KoboldCppClient:
             )
         
         except Exception as e:
-            self.logger.error(f"Text generation failed: {e}")
+            self.logger.error("Text generation failed: %s", e)
+            raise
+    
+    async def generate_text_streamed(
+        self,
+        params: GenerateTextParams,
+        on_chunk: Callable[[GenerationChunk], Awaitable[None]]
+    ) -> GenerationResult:
+        """Generate text token by token, passing each chunk to on_chunk as it arrives
+        
+        The final chunk has done set and an empty delta. The returned result
+        holds the full text, as generate_text would.
+        """
+        start_time = time.perf_counter()
+        request_data = self._generate_payload(params)
+        parts: List[str] = []
+        
+        try:
+            async with self._request_semaphore:
+                async for token in self._stream_generate(request_data):
+                    await on_chunk(GenerationChunk(delta=token, index=len(parts)))
+                    parts.append(token)
+            await on_chunk(GenerationChunk(delta="", index=len(parts), done=True))
+            
+            generation_time = time.perf_counter() - start_time
+            tokens_generated = len(parts)
+            
+            return GenerationResult(
+                text="".join(parts),
+                tokens_generated=tokens_generated,
+                generation_time=generation_time,
+                tokens_per_second=tokens_generated / generation_time if generation_time > 0 else 0,
+                finish_reason="stop"
+            )
+        
+        except Exception as e:
+            self.logger.error("Streamed text generation failed: %s", e)
             raise
     
     async def _stream_generate(self, request_data: Dict[str, Any]) -> AsyncGenerator[str, None]:
@@ -199,21 +421,23 @@ class KoboldCppClient:
         if not self.session:
             await self.connect()
         
-        url = f"{self.config.url.rstrip('/')}{self.config.generate_endpoint}"
-        
-        async with self.session.post(url, json=request_data) as response:
-            async for line in response.content:
-                if line:
-                    try:
-                        data = json.loads(line.decode('utf-8').strip())
-                        if "token" in data:
-                            yield data["token"]
-                    except json.JSONDecodeError:
-                        continue
+        async with self.session.post(self._url_stream, data=orjson.dumps(request_data)) as response:
+            if response.status != 200:
+                body = await response.read()
+                raise aiohttp.ClientError(
+                    f"HTTP {response.status}: {body.decode('utf-8', errors='replace')}"
+                )
+            async for obj in _iter_json_objects(response.content):
+                try:
+                    data = orjson.loads(obj)
+                except orjson.JSONDecodeError:
+                    continue
+                if "token" in data:
+                    yield data["token"]
     
     async def chat_completion(self, params: ChatCompletionParams) -> GenerationResult:
         """Generate chat completion using OpenAI-compatible endpoint"""
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         # Convert to OpenAI format
         request_data = {
@@ -227,11 +451,15 @@ class KoboldCppClient:
             "top_p": params.top_p,
             "stream": params.stream
         }
+        # The id is only a label for the session; KoboldCpp ignores "user" and
+        # reuses its KV cache by matching the prompt prefix on its own
+        if params.conversation_id is not None:
+            request_data["user"] = params.conversation_id
         
         try:
-            response = await self._make_request("POST", self.config.chat_endpoint, request_data)
+            response = await self._make_request("POST", self._url_chat, request_data)
             
-            generation_time = time.time() - start_time
+            generation_time = time.perf_counter() - start_time
             
             # Extract response from OpenAI format
             choices = response.get("choices", [])
@@ -242,8 +470,10 @@ class KoboldCppClient:
             generated_text = message.get("content", "")
             finish_reason = choices[0].get("finish_reason", "stop")
             
-            # Estimate tokens (KoboldCpp might not return token count)
-            tokens_generated = response.get("usage", {}).get("completion_tokens", len(generated_text.split()))
+            # Estimate tokens only if KoboldCpp didn't return a count
+            tokens_generated = response.get("usage", {}).get("completion_tokens")
+            if tokens_generated is None:
+                tokens_generated = _estimate_tokens(generated_text)
             
             return GenerationResult(
                 text=generated_text,
@@ -254,57 +484,75 @@ class KoboldCppClient:
             )
         
         except Exception as e:
-            self.logger.error(f"Chat completion failed: {e}")
+            self.logger.error("Chat completion failed: %s", e)
             raise
     
-    async def batch_generate(self, batch_request: BatchRequest) -> BatchResult:
-        """Process multiple prompts in batch with concurrency control"""
-        start_time = time.time()
-        results = []
-        successful = 0
-        failed = 0
+    async def batch_generate_iter(
+        self, batch_request: BatchRequest
+    ) -> AsyncGenerator[Tuple[int, GenerationResult], None]:
+        """Yield (prompt index, result) pairs as generations complete
         
-        # Create semaphore for batch concurrency
-        batch_semaphore = asyncio.Semaphore(batch_request.max_concurrent)
+        A fixed pool of max_concurrent workers pulls prompts, so only that many
+        generations exist at once, and each result is handed to the caller as
+        soon as it is ready. Failed prompts yield a result with finish_reason
+        "error".
+        """
+        prompts = iter(enumerate(batch_request.prompts))
+        queue: asyncio.Queue = asyncio.Queue(maxsize=batch_request.max_concurrent * 2)
         
-        async def process_single(prompt: str) -> Optional[GenerationResult]:
-            """Process a single prompt with semaphore control"""
-            async with batch_semaphore:
-                try:
-                    params = GenerateTextParams(prompt=prompt, **batch_request.parameters.model_dump())
-                    result = await self.generate_text(params)
-                    return result
-                except Exception as e:
-                    self.logger.error(f"Failed to process prompt: {e}")
-                    return None
+        async def worker() -> None:
+            for index, prompt in prompts:
+                await queue.put((index, await self._batch_generate_one(batch_request, prompt)))
         
-        # Process all prompts concurrently
-        tasks = [process_single(prompt) for prompt in batch_request.prompts]
-        batch_results = await asyncio.gather(*tasks, return_exceptions=True)
+        worker_count = max(1, min(batch_request.max_concurrent, len(batch_request.prompts)))
+        workers = [asyncio.ensure_future(worker()) for _ in range(worker_count)]
+        try:
+            for _ in range(len(batch_request.prompts)):
+                yield await queue.get()
+        finally:
+            for task in workers:
+                task.cancel()
+    
+    async def _batch_generate_one(self, batch_request: BatchRequest, prompt: str) -> GenerationResult:
+        """Generate one batch prompt, turning a failure into an "error" result"""
+        try:
+            params = batch_request.parameters.model_copy(update={"prompt": prompt})
+            return await self.generate_text(params)
+        except Exception as e:
+            self.logger.error("Failed to process prompt: %s", e)
+            return GenerationResult(
+                text="",
+                tokens_generated=0,
+                generation_time=0,
+                tokens_per_second=0,
+                finish_reason="error"
+            )
+    
+    async def batch_generate(self, batch_request: BatchRequest) -> BatchResult:
+        """Process multiple prompts in batch with concurrency control"""
+        start_time = time.perf_counter()
+        prompts = iter(enumerate(batch_request.prompts))
+        slots: List[Optional[GenerationResult]] = [None] * len(batch_request.prompts)
         
-        # Collect results and count successes/failures
-        for result in batch_results:
-            if isinstance(result, GenerationResult):
-                results.append(result)
-                successful += 1
-            else:
-                failed += 1
-                # Add empty result for failed prompts to maintain order
-                results.append(GenerationResult(
-                    text="",
-                    tokens_generated=0,
-                    generation_time=0,
-                    tokens_per_second=0,
-                    finish_reason="error"
-                ))
+        # Same fixed worker pool as batch_generate_iter, but each worker writes
+        # straight into its prompt's slot instead of going through a queue
+        async def worker() -> None:
+            for index, prompt in prompts:
+                slots[index] = await self._batch_generate_one(batch_request, prompt)
+        
+        worker_count = max(1, min(batch_request.max_concurrent, len(batch_request.prompts)))
+        await asyncio.gather(*(worker() for _ in range(worker_count)))
+        # Every prompt has been generated, so no slot is still None
+        results = cast(List[GenerationResult], slots)
+        successful = sum(result.finish_reason != "error" for result in results)
         
-        total_time = time.time() - start_time
+        total_time = time.perf_counter() - start_time
         
         return BatchResult(
             results=results,
             total_time=total_time,
             successful=successful,
-            failed=failed
+            failed=len(results) - successful
         )
     
     async def health_check(self) -> bool:
@@ -6,25 +6,41 @@ WebSocket communication between Claude Code and the KoboldCpp MCP server.
 """
 
 import asyncio
-import json
+import inspect
 import logging
 import traceback
-from typing import Dict, Any, Optional, List, Callable, Union
+from typing import Dict, Any, Optional, List, Awaitable, Callable, Union
+import orjson
 import websockets
+from pydantic import ValidationError
 from websockets.server import WebSocketServerProtocol
 
 from .message_types import (
     MCPRequest, MCPResponse, MCPNotification, MCPError,
-    InitializeRequest, InitializeResponse,
-    ListToolsRequest, ListToolsResponse, ToolDefinition,
+    InitializeRequest, InitializeResponse, ClientCapabilitiesDict,
+    ListToolsRequest, ToolDefinition,
     CallToolRequest, CallToolResponse, ToolResult,
-    ListResourcesRequest, ListResourcesResponse, ResourceDefinition,
+    ListResourcesRequest, ResourceDefinition,
     ReadResourceRequest, ReadResourceResponse,
-    MessageType
+    GenerationChunk, MessageType, MCPRequestAny, validate_request
 )
 from ..config.settings import get_settings
 
 
+# The initialize result is the same for every client, so it is encoded once
+_INITIALIZE_RESULT = orjson.dumps(InitializeResponse().result)
+
+
+class ConnectionState:
+    """Protocol state for a single MCP client connection"""
+    __slots__ = ("websocket", "initialized", "client_capabilities")
+    
+    def __init__(self, websocket: WebSocketServerProtocol) -> None:
+        self.websocket = websocket
+        self.initialized = False
+        self.client_capabilities: ClientCapabilitiesDict = {}
+
+
 class MCPHandler:
     """Handles MCP protocol communication and message routing"""
     
@@ -33,16 +49,33 @@ class MCPHandler:
         self.settings = get_settings()
         self.tools: Dict[str, Callable] = {}
         self.resources: Dict[str, Callable] = {}
-        self.initialized = False
-        self.client_capabilities: Dict[str, Any] = {}
+        
+        # Encoded "result" payloads for responses that only change when
+        # tools or resources are registered
+        self._tools_list_cache: Optional[bytes] = None
+        self._resources_list_cache: Optional[bytes] = None
+        
+        self._method_handlers: Dict[str, Callable] = {
+            "initialize": self._handle_initialize,
+            "tools/list": self._handle_list_tools,
+            "tools/call": self._handle_call_tool,
+            "resources/list": self._handle_list_resources,
+            "resources/read": self._handle_read_resource,
+        }
     
     def register_tool(self, name: str, handler: Callable, definition: ToolDefinition) -> None:
-        """Register a tool handler"""
+        """Register a tool handler
+        
+        Handlers that accept an on_chunk argument can stream partial output;
+        it is wired to progress notifications when the client asks for them.
+        """
         self.tools[name] = {
             "handler": handler,
-            "definition": definition
+            "definition": definition,
+            "streaming": "on_chunk" in inspect.signature(handler).parameters
         }
-        self.logger.info(f"Registered tool: {name}")
+        self._tools_list_cache = None
+        self.logger.info("Registered tool: %s", name)
     
     def register_resource(self, uri: str, handler: Callable, definition: ResourceDefinition) -> None:
         """Register a resource handler"""
@@ -50,107 +83,146 @@ class MCPHandler:
             "handler": handler,
             "definition": definition
         }
-        self.logger.info(f"Registered resource: {uri}")
+        self._resources_list_cache = None
+        self.logger.info("Registered resource: %s", uri)
     
     async def handle_connection(self, websocket: WebSocketServerProtocol, path: str) -> None:
         """Handle new WebSocket connection"""
         client_addr = websocket.remote_address
-        self.logger.info(f"New MCP connection from {client_addr}")
+        self.logger.info("New MCP connection from %s", client_addr)
+        state = ConnectionState(websocket)
         
         try:
             async for message in websocket:
                 try:
-                    await self._process_message(websocket, message)
+                    await self._process_message(websocket, message, state)
                 except Exception as e:
-                    self.logger.error(f"Error processing message: {e}")
+                    self.logger.error("Error processing message: %s", e)
                     error_response = self._create_error_response(
                         None, -32603, f"Internal error: {str(e)}"
                     )
-                    await websocket.send(json.dumps(error_response.model_dump()))
+                    await self._send(websocket, error_response)
         
         except websockets.exceptions.ConnectionClosed:
-            self.logger.info(f"MCP connection closed: {client_addr}")
+            self.logger.info("MCP connection closed: %s", client_addr)
         except Exception as e:
-            self.logger.error(f"Connection error: {e}")
-        finally:
-            self.initialized = False
+            self.logger.error("Connection error: %s", e)
     
-    async def _process_message(self, websocket: WebSocketServerProtocol, message: str) -> None:
-        """Process incoming MCP message"""
+    async def _send(self, websocket: WebSocketServerProtocol, response: Union[MCPResponse, bytes]) -> None:
+        """Serialize and send a response as a binary frame of UTF-8 JSON"""
+        await websocket.send(self._encode(response))
+    
+    @staticmethod
+    def _encode(response: Union[MCPResponse, bytes]) -> bytes:
+        """Serialize a response model to JSON bytes; encoded responses pass through"""
+        if isinstance(response, bytes):
+            return response
+        # Same output as model_dump_json(), but as bytes and in one pass
+        return response.__pydantic_serializer__.to_json(response)
+    
+    @staticmethod
+    def _encode_result(request_id: Union[str, int], result: bytes) -> bytes:
+        """Wrap an already-encoded result in a JSON-RPC response envelope"""
+        return b'{"jsonrpc":"2.0","id":%s,"result":%s}' % (orjson.dumps(request_id), result)
+    
+    async def _process_message(
+        self, websocket: WebSocketServerProtocol, message: Union[str, bytes], state: ConnectionState
+    ) -> None:
+        """Process incoming MCP message from a text (str) or binary (bytes) frame"""
         try:
-            data = json.loads(message)
-        except json.JSONDecodeError as e:
+            data = orjson.loads(message)
+        except orjson.JSONDecodeError as e:
             error_response = self._create_error_response(
                 None, -32700, f"Parse error: {str(e)}"
             )
-            await websocket.send(json.dumps(error_response.model_dump()))
+            await self._send(websocket, error_response)
             return
         
+        response = await self._dispatch(websocket, data, state)
+        if response is not None:
+            await self._send(websocket, response)
+    
+    async def _dispatch(
+        self, websocket: WebSocketServerProtocol, data: Any, state: ConnectionState
+    ) -> Optional[Union[MCPResponse, bytes]]:
+        """Handle one decoded message; returns None for notifications"""
+        if not isinstance(data, dict):
+            return self._create_error_response(None, -32600, "Invalid request")
+        
         # Handle notifications (no response expected)
         if "id" not in data:
             await self._handle_notification(websocket, data)
-            return
+            return None
         
         # Handle requests (response expected)
         try:
-            request = MCPRequest(**data)
-            response = await self._handle_request(request)
-            await websocket.send(json.dumps(response.model_dump()))
+            request = validate_request(data)
+        except ValidationError as e:
+            return self._validation_error_response(data, e)
+        
+        try:
+            return await self._handle_request(request, state)
         
         except Exception as e:
-            self.logger.error(f"Request handling error: {e}")
-            error_response = self._create_error_response(
+            self.logger.error("Request handling error: %s", e)
+            return self._create_error_response(
                 data.get("id"), -32603, f"Internal error: {str(e)}"
             )
-            await websocket.send(json.dumps(error_response.model_dump()))
+    
+    def _validation_error_response(self, data: Dict[str, Any], error: ValidationError) -> MCPResponse:
+        """Map a request that failed validation to the matching JSON-RPC error"""
+        first = error.errors(include_url=False)[0]
+        if first["type"] == "union_tag_invalid":
+            code, message = -32601, f"Method not found: {data.get('method')}"
+        elif "params" in first["loc"]:
+            location = ".".join(str(part) for part in first["loc"][2:])
+            code, message = -32602, f"Invalid params: {location or 'params'}: {first['msg']}"
+        else:
+            code, message = -32600, f"Invalid request: {first['msg']}"
+        
+        request_id = data.get("id")
+        if not isinstance(request_id, (str, int)):
+            request_id = None
+        return self._create_error_response(request_id, code, message)
     
     async def _handle_notification(self, websocket: WebSocketServerProtocol, data: Dict[str, Any]) -> None:
         """Handle MCP notifications"""
+        # The one notification we act on needs no validation
+        if data.get("method") == "notifications/initialized":
+            self.logger.info("Client initialization complete")
+            return
+        
         try:
             notification = MCPNotification(**data)
-            method = notification.method
-            
-            if method == "notifications/initialized":
-                self.logger.info("Client initialization complete")
-            else:
-                self.logger.warning(f"Unknown notification method: {method}")
+            self.logger.warning("Unknown notification method: %s", notification.method)
         
         except Exception as e:
-            self.logger.error(f"Notification handling error: {e}")
+            self.logger.error("Notification handling error: %s", e)
     
-    async def _handle_request(self, request: MCPRequest) -> MCPResponse:
+    async def _handle_request(self, request: MCPRequestAny, state: ConnectionState) -> Union[MCPResponse, bytes]:
         """Route and handle MCP requests"""
         method = request.method
         request_id = request.id
         
+        # Unknown methods never get here: they fail the discriminated union in
+        # validate_request and are answered with -32601 there
+        handler = self._method_handlers[method]
+        
         try:
-            if method == "initialize":
-                return await self._handle_initialize(request)
-            elif method == "tools/list":
-                return await self._handle_list_tools(request)
-            elif method == "tools/call":
-                return await self._handle_call_tool(request)
-            elif method == "resources/list":
-                return await self._handle_list_resources(request)
-            elif method == "resources/read":
-                return await self._handle_read_resource(request)
-            else:
-                return self._create_error_response(
-                    request_id, -32601, f"Method not found: {method}"
-                )
+            return await handler(request, state)
         
         except Exception as e:
-            self.logger.error(f"Request handler error for {method}: {e}")
+            self.logger.error("Request handler error for %s: %s", method, e)
             return self._create_error_response(
                 request_id, -32603, f"Internal error: {str(e)}"
             )
     
-    async def _handle_initialize(self, request: MCPRequest) -> MCPResponse:
+    async def _handle_initialize(self, request: InitializeRequest, state: ConnectionState) -> Union[MCPResponse, bytes]:
         """Handle initialization request"""
-        params = request.params or {}
+        params = request.params
         
         # Validate protocol version
-        protocol_version = params.get("protocolVersion")
+        protocol_version = params.protocolVersion
         if protocol_version != "2024-11-05":
             return self._create_error_response(
                 request.id, -32602, 
@@ -158,38 +230,38 @@ class MCPHandler:
             )
         
         # Store client capabilities
-        self.client_capabilities = params.get("capabilities", {})
-        client_info = params.get("clientInfo", {})
+        state.client_capabilities = params.capabilities
+        client_info = params.clientInfo
         
-        self.logger.info(f"Initializing MCP session with {client_info.get('name', 'unknown')} v{client_info.get('version', 'unknown')}")
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(
+                "Initializing MCP session with %s v%s",
+                client_info.get('name', 'unknown'),
+                client_info.get('version', 'unknown')
+            )
         
         # Mark as initialized
-        self.initialized = True
+        state.initialized = True
         
         # Return server capabilities
-        response = InitializeResponse(id=request.id)
-        return response
+        return self._encode_result(request.id, _INITIALIZE_RESULT)
     
-    async def _handle_list_tools(self, request: MCPRequest) -> MCPResponse:
+    async def _handle_list_tools(self, request: MCPRequest, state: ConnectionState) -> Union[MCPResponse, bytes]:
         """Handle tools/list request"""
-        if not self.initialized:
+        if not state.initialized:
             return self._create_error_response(
                 request.id, -32002, "Server not initialized"
             )
         
-        tool_definitions = [
-            tool_info["definition"] for tool_info in self.tools.values()
-        ]
-        
-        response = ListToolsResponse(
-            id=request.id,
-            result={"tools": tool_definitions}
-        )
-        return response
+        if self._tools_list_cache is None:
+            self._tools_list_cache = orjson.dumps({"tools": [
+                tool_info["definition"].model_dump(mode="json") for tool_info in self.tools.values()
+            ]})
+        return self._encode_result(request.id, self._tools_list_cache)
     
-    async def _handle_call_tool(self, request: CallToolRequest) -> MCPResponse:
+    async def _handle_call_tool(self, request: CallToolRequest, state: ConnectionState) -> Union[MCPResponse, bytes]:
         """Handle tools/call request"""
-        if not self.initialized:
+        if not state.initialized:
             return self._create_error_response(
                 request.id, -32002, "Server not initialized"
             )
@@ -210,66 +282,90 @@ class MCPHandler:
             # Execute tool with audit logging if enabled
             if self.settings.logging.audit_log:
                 audit_logger = logging.getLogger('audit')
-                audit_logger.info(f"TOOL_CALL: {tool_name} with args: {arguments}")
+                if audit_logger.isEnabledFor(logging.INFO):
+                    audit_logger.info("TOOL_CALL: %s with args: %s", tool_name, arguments)
+            
+            # Stream chunks as progress notifications if the client sent a
+            # progress token; never let arguments supply the callback
+            if tool_info["streaming"]:
+                meta = request.params.meta or {}
+                progress_token = meta.get("progressToken")
+                arguments = {
+                    **arguments,
+                    "on_chunk": None if progress_token is None
+                    else self._chunk_notifier(state.websocket, progress_token)
+                }
             
             result = await handler(**arguments)
             
             # Ensure result is in correct format
             if isinstance(result, dict):
-                tool_result = ToolResult(content=[result])
+                content = [result]
             elif isinstance(result, list):
-                tool_result = ToolResult(content=result)
+                content = result
             else:
-                tool_result = ToolResult(content=[{"type": "text", "text": str(result)}])
+                content = [{"type": "text", "text": str(result)}]
             
-            response = CallToolResponse(
-                id=request.id,
-                result=tool_result
+            # Tool output is plain JSON data, so it is encoded straight into
+            # the envelope without building ToolResult/CallToolResponse models
+            return self._encode_result(
+                request.id, orjson.dumps({"content": content, "isError": False})
             )
-            return response
         
         except Exception as e:
-            self.logger.error(f"Tool execution error for {tool_name}: {e}")
-            error_result = ToolResult(
+            self.logger.error("Tool execution error for %s: %s", tool_name, e)
+            error_result = ToolResult.model_construct(
                 content=[{"type": "text", "text": f"Tool execution failed: {str(e)}"}],
                 isError=True
             )
-            response = CallToolResponse(
+            response = CallToolResponse.model_construct(
                 id=request.id,
                 result=error_result
             )
             return response
     
-    async def _handle_list_resources(self, request: MCPRequest) -> MCPResponse:
+    @staticmethod
+    def _chunk_notifier(
+        websocket: WebSocketServerProtocol, progress_token: Union[str, int]
+    ) -> Callable[[GenerationChunk], Awaitable[None]]:
+        """Build a callback that sends each generation chunk as a progress notification
+        
+        The 2024-11-05 progress params only define progressToken, progress and
+        total, so the chunk itself travels under the reserved _meta key.
+        """
+        token = orjson.dumps(progress_token)
+        
+        async def send_chunk(chunk: GenerationChunk) -> None:
+            await websocket.send(
+                b'{"jsonrpc":"2.0","method":"notifications/progress","params":'
+                b'{"progressToken":%s,"progress":%d,"_meta":{"chunk":%s}}}'
+                % (token, chunk.index + 1, chunk.__pydantic_serializer__.to_json(chunk))
+            )
+        
+        return send_chunk
+    
+    async def _handle_list_resources(self, request: MCPRequest, state: ConnectionState) -> Union[MCPResponse, bytes]:
         """Handle resources/list request"""
-        if not self.initialized:
+        if not state.initialized:
             return self._create_error_response(
                 request.id, -32002, "Server not initialized"
             )
         
-        resource_definitions = [
-            resource_info["definition"] for resource_info in self.resources.values()
-        ]
-        
-        response = ListResourcesResponse(
-            id=request.id,
-            result={"resources": resource_definitions}
-        )
-        return response
+        if self._resources_list_cache is None:
+            self._resources_list_cache = orjson.dumps({"resources": [
+                resource_info["definition"].model_dump(mode="json")
+                for resource_info in self.resources.values()
+            ]})
+        return self._encode_result(request.id, self._resources_list_cache)
     
-    async def _handle_read_resource(self, request: ReadResourceRequest) -> MCPResponse:
+    async def _handle_read_resource(self, request: ReadResourceRequest, state: ConnectionState) -> Union[MCPResponse, bytes]:
         """Handle resources/read request"""
-        if not self.initialized:
+        if not state.initialized:
             return self._create_error_response(
                 request.id, -32002, "Server not initialized"
             )
         
-        uri = request.params.get("uri")
-        if not uri:
-            return self._create_error_response(
-                request.id, -32602, "Missing required parameter: uri"
-            )
-        
+        uri = request.params.uri
         if uri not in self.resources:
             return self._create_error_response(
                 request.id, -32601, f"Resource not found: {uri}"
@@ -282,14 +378,18 @@ class MCPHandler:
             
             result = await handler(uri)
             
-            response = ReadResourceResponse(
+            # Handlers may return the result already encoded as JSON bytes
+            if isinstance(result, bytes):
+                return self._encode_result(request.id, result)
+            
+            response = ReadResourceResponse.model_construct(
                 id=request.id,
                 result=result
             )
             return response
         
         except Exception as e:
-            self.logger.error(f"Resource read error for {uri}: {e}")
+            self.logger.error("Resource read error for %s: %s", uri, e)
             return self._create_error_response(
                 request.id, -32603, f"Resource read failed: {str(e)}"
             )
@@ -301,16 +401,16 @@ class MCPHandler:
         message: str,
         data: Optional[Dict[str, Any]] = None
     ) -> MCPResponse:
-        """Create an error response"""
-        error = MCPError(code=code, message=message, data=data)
-        return MCPResponse(id=request_id, error=error)
+        """Create an error response from trusted values, skipping validation"""
+        error = MCPError.model_construct(code=code, message=message, data=data)
+        return MCPResponse.model_construct(id=request_id, error=error)
     
     def get_server_capabilities(self) -> Dict[str, Any]:
         """Get server capabilities for initialization"""
         return {
             "tools": {"listChanged": True},
             "resources": {"listChanged": True},
-            "experimental": {}
+            "experimental": {"binaryFrames": {}}
         }
     
     def get_server_info(self) -> Dict[str, Any]:
@@ -5,11 +5,18 @@ Implements the Model Context Protocol version 2024-11-05 message types
 for communication between Claude Code and the KoboldCpp MCP server.
 """
 
+import copy
 from typing import Any, Dict, List, Optional, Union, Literal
-from pydantic import BaseModel, Field
+from typing_extensions import Annotated, TypedDict
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 from enum import Enum
 
 
+class _MessageModel(BaseModel):
+    """Base for protocol messages; read-only once built, unknown fields ignored"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
+
 class MessageType(str, Enum):
     """MCP message types"""
     INITIALIZE = "initialize"
@@ -22,14 +29,14 @@ class MessageType(str, Enum):
     ERROR = "error"
 
 
-class MCPError(BaseModel):
+class MCPError(_MessageModel):
     """MCP error structure"""
     code: int
     message: str
     data: Optional[Dict[str, Any]] = None
 
 
-class MCPRequest(BaseModel):
+class MCPRequest(_MessageModel):
     """Base MCP request message"""
     jsonrpc: str = "2.0"
     id: Union[str, int]
@@ -37,76 +44,100 @@ class MCPRequest(BaseModel):
     params: Optional[Dict[str, Any]] = None
 
 
-class MCPResponse(BaseModel):
+class MCPResponse(_MessageModel):
     """Base MCP response message"""
     jsonrpc: str = "2.0"
-    id: Union[str, int]
+    id: Optional[Union[str, int]] = None  # null when the request id was unreadable
     result: Optional[Dict[str, Any]] = None
     error: Optional[MCPError] = None
 
 
-class MCPNotification(BaseModel):
+class MCPNotification(_MessageModel):
     """MCP notification message"""
     jsonrpc: str = "2.0"
     method: str
     params: Optional[Dict[str, Any]] = None
 
 
-class ClientCapabilities(BaseModel):
+class ClientCapabilities(_MessageModel):
     """Client capabilities for initialization"""
     experimental: Optional[Dict[str, Any]] = None
     sampling: Optional[Dict[str, Any]] = None
 
 
-class ServerCapabilities(BaseModel):
+class ServerCapabilities(_MessageModel):
     """Server capabilities declaration"""
     tools: Optional[Dict[str, Any]] = None
     resources: Optional[Dict[str, Any]] = None
     experimental: Optional[Dict[str, Any]] = None
 
 
+class ClientCapabilitiesDict(TypedDict, total=False):
+    """Capabilities object sent by the client in initialize"""
+    roots: Dict[str, Any]
+    sampling: Dict[str, Any]
+    experimental: Dict[str, Any]
+
+
+class ClientInfoDict(TypedDict, total=False):
+    """Client implementation details sent in initialize"""
+    name: str
+    version: str
+
+
+class InitializeParams(_MessageModel):
+    """Initialize request parameters"""
+    protocolVersion: Optional[str] = None
+    capabilities: ClientCapabilitiesDict = Field(default_factory=dict)
+    clientInfo: ClientInfoDict = Field(default_factory=dict)
+
+
+# Template for the initialize result; each InitializeResponse gets its own
+# copy, since freezing the model does not freeze the nested dicts
+_SERVER_INITIALIZE_RESULT: Dict[str, Any] = {
+    "protocolVersion": "2024-11-05",
+    "capabilities": {
+        "tools": {"listChanged": True},
+        "resources": {"listChanged": True},
+        # Messages may be sent as binary frames of UTF-8 JSON, which the
+        # server parses without decoding to str first
+        "experimental": {"binaryFrames": {}}
+    },
+    "serverInfo": {
+        "name": "koboldcpp-mcp-server",
+        "version": "1.0.0"
+    }
+}
+
+
 class InitializeRequest(MCPRequest):
     """Initialize request from client"""
     method: Literal["initialize"] = "initialize"
-    params: Dict[str, Any] = Field(default_factory=lambda: {
-        "protocolVersion": "2024-11-05",
-        "capabilities": {},
-        "clientInfo": {
-            "name": "claude-code",
-            "version": "1.0.0"
-        }
-    })
+    params: InitializeParams
 
 
 class InitializeResponse(MCPResponse):
     """Initialize response from server"""
-    result: Dict[str, Any] = Field(default_factory=lambda: {
-        "protocolVersion": "2024-11-05",
-        "capabilities": {
-            "tools": {"listChanged": True},
-            "resources": {"listChanged": True}
-        },
-        "serverInfo": {
-            "name": "koboldcpp-mcp-server",
-            "version": "1.0.0"
-        }
-    })
-
-
-class ToolDefinition(BaseModel):
+    result: Dict[str, Any] = Field(
+        default_factory=lambda: copy.deepcopy(_SERVER_INITIALIZE_RESULT)
+    )
+
+
+class ToolDefinition(_MessageModel):
     """Tool definition for MCP"""
     name: str
     description: str
     inputSchema: Dict[str, Any]
 
 
-class ToolCall(BaseModel):
+class ToolCall(_MessageModel):
     """Tool call parameters"""
     name: str
-    arguments: Dict[str, Any]
+    arguments: Dict[str, Any] = Field(default_factory=dict)
+    meta: Optional[Dict[str, Any]] = Field(default=None, alias="_meta")
 
 
-class ToolResult(BaseModel):
+class ToolResult(_MessageModel):
     """Tool execution result"""
     content: List[Dict[str, Any]]
     isError: bool = False
@@ -133,7 +164,7 @@ class CallToolResponse(MCPResponse):
     result: ToolResult
 
 
-class ResourceDefinition(BaseModel):
+class ResourceDefinition(_MessageModel):
     """Resource definition for MCP"""
     uri: str
     name: str
@@ -151,10 +182,15 @@ class ListResourcesResponse(MCPResponse):
     result: Dict[str, List[ResourceDefinition]]
 
 
+class ReadResourceParams(_MessageModel):
+    """Read resource request parameters"""
+    uri: str
+
+
 class ReadResourceRequest(MCPRequest):
     """Read resource request"""
     method: Literal["resources/read"] = "resources/read"
-    params: Dict[str, str]  # Contains "uri"
+    params: ReadResourceParams
 
 
 class ReadResourceResponse(MCPResponse):
@@ -164,7 +200,7 @@ class ReadResourceResponse(MCPResponse):
 
 # KoboldCpp-specific message types
 
-class GenerateTextParams(BaseModel):
+class GenerateTextParams(_MessageModel):
     """Parameters for text generation"""
     prompt: str
     max_tokens: int = 100
@@ -178,22 +214,24 @@ class GenerateTextParams(BaseModel):
     stream: bool = False
 
 
-class ChatMessage(BaseModel):
+class ChatMessage(_MessageModel):
     """Chat message structure"""
     role: Literal["user", "assistant", "system"]
     content: str
 
 
-class ChatCompletionParams(BaseModel):
+class ChatCompletionParams(_MessageModel):
     """Parameters for chat completion"""
     messages: List[ChatMessage]
     max_tokens: int = 100
     temperature: float = 0.7
     top_p: float = 0.9
     stream: bool = False
+    # Caller-chosen label for the conversation; no effect on caching
+    conversation_id: Optional[str] = None
 
 
-class ModelInfo(BaseModel):
+class ModelInfo(_MessageModel):
     """Model information structure"""
     model_name: str
     context_length: int
@@ -203,7 +241,14 @@ class ModelInfo(BaseModel):
     format: Optional[str] = None
 
 
-class GenerationResult(BaseModel):
+class GenerationChunk(_MessageModel):
+    """Incremental piece of a streamed text generation"""
+    delta: str
+    index: int
+    done: bool = False
+
+
+class GenerationResult(_MessageModel):
     """Text generation result"""
     text: str
     tokens_generated: int
@@ -212,16 +257,30 @@ class GenerationResult(BaseModel):
     finish_reason: str
 
 
-class BatchRequest(BaseModel):
+class BatchRequest(_MessageModel):
     """Batch processing request"""
     prompts: List[str]
     parameters: GenerateTextParams
     max_concurrent: int = 3
 
 
-class BatchResult(BaseModel):
+class BatchResult(_MessageModel):
     """Batch processing result"""
     results: List[GenerationResult]
     total_time: float
     successful: int
-    failed: int
\ No newline at end of file
+    failed: int
+
+
+# Any supported request, told apart by its method so that pydantic-core
+# validates the typed params in a single pass
+MCPRequestAny = Annotated[
+    Union[
+        InitializeRequest, ListToolsRequest, CallToolRequest,
+        ListResourcesRequest, ReadResourceRequest
+    ],
+    Field(discriminator="method")
+]
+
+# Validator for the per-message hot path, bound to its schema once
+validate_request = TypeAdapter(MCPRequestAny).validate_python
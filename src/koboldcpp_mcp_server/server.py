@@ -12,20 +12,37 @@ import asyncio
 import logging
 import signal
 import sys
-from typing import Dict, Any, Optional
+from typing import Optional
+import orjson
 import websockets
 from websockets.server import WebSocketServerProtocol
 
 from .config.settings import get_settings, setup_logging
 from .protocol.mcp_handler import MCPHandler
 from .protocol.message_types import ToolDefinition, ResourceDefinition
-from .kobold_client import KoboldCppClient
+from .kobold_client import KoboldCppClient, close_shared_sessions
 from .tools.text_generation import TextGenerationTools
 
 
+# resources/read result carrying a single JSON document as its text
+_JSON_RESOURCE_RESULT = b'{"contents":[{"uri":%s,"mimeType":"application/json","text":%s}]}'
+
+
+def _json_resource(uri: str, document: bytes) -> bytes:
+    """Encode a resources/read result for an already-encoded JSON document"""
+    return _JSON_RESOURCE_RESULT % (orjson.dumps(uri), orjson.dumps(document.decode()))
+
+
 class MCPServer:
     """Main MCP server class"""
     
+    __slots__ = (
+        "settings", "logger", "mcp_handler", "kobold_client",
+        "text_tools", "server", "_stop_requested"
+    )
+    
+    _TOOL_NAMES = frozenset({"generate_text", "chat_completion", "test_prompt", "batch_generate"})
+    
     def __init__(self):
         self.settings = get_settings()
         self.logger = logging.getLogger(__name__)
@@ -33,7 +50,7 @@ class MCPServer:
         self.kobold_client: Optional[KoboldCppClient] = None
         self.text_tools: Optional[TextGenerationTools] = None
         self.server = None
-        self._shutdown_event = asyncio.Event()
+        self._stop_requested = False
     
     async def initialize(self) -> None:
         """Initialize server components"""
@@ -47,9 +64,9 @@ class MCPServer:
         
         # Check KoboldCpp connection
         if not await self.kobold_client.health_check():
-            self.logger.warning(f"KoboldCpp server at {self.settings.koboldcpp.url} is not responding")
+            self.logger.warning("KoboldCpp server at %s is not responding", self.settings.koboldcpp.url)
         else:
-            self.logger.info(f"Connected to KoboldCpp at {self.settings.koboldcpp.url}")
+            self.logger.info("Connected to KoboldCpp at %s", self.settings.koboldcpp.url)
         
         # Initialize tools
         self.text_tools = TextGenerationTools(self.kobold_client)
@@ -69,33 +86,16 @@ class MCPServer:
         
         tool_definitions = self.text_tools.get_tool_definitions()
         
+        # Each tool is served by the TextGenerationTools method of the same name
         for tool_def in tool_definitions:
-            if tool_def.name == "generate_text":
+            if tool_def.name in self._TOOL_NAMES:
                 self.mcp_handler.register_tool(
                     tool_def.name,
-                    self.text_tools.generate_text,
-                    tool_def
-                )
-            elif tool_def.name == "chat_completion":
-                self.mcp_handler.register_tool(
-                    tool_def.name,
-                    self.text_tools.chat_completion,
-                    tool_def
-                )
-            elif tool_def.name == "test_prompt":
-                self.mcp_handler.register_tool(
-                    tool_def.name,
-                    self.text_tools.test_prompt,
-                    tool_def
-                )
-            elif tool_def.name == "batch_generate":
-                self.mcp_handler.register_tool(
-                    tool_def.name,
-                    self.text_tools.batch_generate,
+                    getattr(self.text_tools, tool_def.name),
                     tool_def
                 )
         
-        self.logger.info(f"Registered {len(tool_definitions)} tools")
+        self.logger.info("Registered %s tools", len(tool_definitions))
     
     async def _register_resources(self) -> None:
         """Register resources with the MCP handler"""
@@ -130,7 +130,7 @@ class MCPServer:
         
         self.logger.info("Registered 2 resources")
     
-    async def _get_model_info(self, uri: str) -> Dict[str, Any]:
+    async def _get_model_info(self, uri: str) -> bytes:
         """Get model information resource"""
         try:
             if not self.kobold_client:
@@ -138,25 +138,15 @@ class MCPServer:
             
             model_info = await self.kobold_client.get_model_info()
             
-            return {
-                "contents": [{
-                    "uri": uri,
-                    "mimeType": "application/json",
-                    "text": model_info.model_dump_json(indent=2)
-                }]
-            }
+            return _json_resource(
+                uri, orjson.dumps(model_info.model_dump(), option=orjson.OPT_INDENT_2)
+            )
         
         except Exception as e:
-            self.logger.error(f"Failed to get model info: {e}")
-            return {
-                "contents": [{
-                    "uri": uri,
-                    "mimeType": "application/json",
-                    "text": f'{{"error": "Failed to get model info: {str(e)}"}}'
-                }]
-            }
+            self.logger.error("Failed to get model info: %s", e)
+            return _json_resource(uri, orjson.dumps({"error": f"Failed to get model info: {e}"}))
     
-    async def _get_server_status(self, uri: str) -> Dict[str, Any]:
+    async def _get_server_status(self, uri: str) -> bytes:
         """Get server status resource"""
         try:
             if not self.kobold_client:
@@ -173,23 +163,11 @@ class MCPServer:
                 "server_url": self.settings.koboldcpp.url
             }
             
-            return {
-                "contents": [{
-                    "uri": uri,
-                    "mimeType": "application/json",
-                    "text": str(status_data).replace("'", '"')  # Convert to JSON format
-                }]
-            }
+            return _json_resource(uri, orjson.dumps(status_data))
         
         except Exception as e:
-            self.logger.error(f"Failed to get server status: {e}")
-            return {
-                "contents": [{
-                    "uri": uri,
-                    "mimeType": "application/json",
-                    "text": f'{{"error": "Failed to get server status: {str(e)}"}}'
-                }]
-            }
+            self.logger.error("Failed to get server status: %s", e)
+            return _json_resource(uri, orjson.dumps({"error": f"Failed to get server status: {e}"}))
     
     async def start(self) -> None:
         """Start the MCP server"""
@@ -198,7 +176,12 @@ class MCPServer:
         host = self.settings.mcp_server.host
         port = self.settings.mcp_server.port
         
-        self.logger.info(f"Starting MCP server on {host}:{port}")
+        self.logger.info("Starting MCP server on %s:%s", host, port)
+        
+        # Browser clients send an Origin header; non-browser MCP clients such
+        # as Claude Code don't, so a missing origin is always accepted.
+        security = self.settings.security
+        origins = None if security.allow_all_origins else security.allowed_origins | {None}
         
         # Create WebSocket server
         self.server = await websockets.serve(
@@ -208,13 +191,22 @@ class MCPServer:
             ping_interval=self.settings.mcp_server.ping_interval,
             ping_timeout=self.settings.mcp_server.ping_timeout,
             max_size=2**20,  # 1MB max message size
-            max_queue=self.settings.mcp_server.max_connections
+            # Clients connect over loopback, where per-message deflate only adds
+            # an inflate/deflate pass and extra buffer copies on large payloads
+            compression=None,
+            max_queue=self.settings.mcp_server.max_connections,
+            origins=origins
         )
         
-        self.logger.info(f"MCP server running on ws://{host}:{port}")
+        self.logger.info("MCP server running on ws://%s:%s", host, port)
+        
+        # A shutdown signal may have arrived while initializing
+        if self._stop_requested:
+            self.server.close()
         
-        # Wait for shutdown signal
-        await self._shutdown_event.wait()
+        # Serve until stop() or a shutdown signal closes the server
+        await self.server.wait_closed()
+        await self._disconnect_client()
     
     async def stop(self) -> None:
         """Stop the MCP server"""
@@ -224,16 +216,21 @@ class MCPServer:
             self.server.close()
             await self.server.wait_closed()
         
+        await self._disconnect_client()
+        self.logger.info("MCP server stopped")
+    
+    async def _disconnect_client(self) -> None:
+        """Release the KoboldCpp client and its pooled HTTP sessions"""
         if self.kobold_client:
             await self.kobold_client.disconnect()
-        
-        self._shutdown_event.set()
-        self.logger.info("MCP server stopped")
+        await close_shared_sessions()
     
     def handle_signal(self, signame: str) -> None:
-        """Handle shutdown signals"""
-        self.logger.info(f"Received signal {signame}, shutting down")
-        asyncio.create_task(self.stop())
+        """Handle shutdown signals; start() returns once the server has closed"""
+        self.logger.info("Received signal %s, shutting down", signame)
+        self._stop_requested = True
+        if self.server:
+            self.server.close()
 
 
 async def main():
@@ -257,12 +254,15 @@ async def main():
     except KeyboardInterrupt:
         await server.stop()
     except Exception as e:
-        logging.error(f"Server error: {e}")
+        logging.error("Server error: %s", e)
         await server.stop()
         sys.exit(1)
 
 
 if __name__ == "__main__":
+    from .cli import install_event_loop_policy
+    install_event_loop_policy()
+    
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -7,33 +7,51 @@ using the KoboldCpp client for local AI inference.
 
 import asyncio
 import logging
-from typing import Dict, Any, List, Optional
-import json
+import re
+from itertools import product
+from typing import Dict, Any, List, Optional, Tuple, AsyncGenerator, Awaitable, Callable
 
 from ..kobold_client import KoboldCppClient
 from ..protocol.message_types import (
     GenerateTextParams, ChatCompletionParams, ChatMessage,
-    BatchRequest, ToolDefinition, GenerationResult
+    BatchRequest, BatchResult, ToolDefinition, GenerationChunk, GenerationResult
 )
 from ..config.settings import get_settings
 
 
+# Special tokens stripped from prompts, matched in a single pass
+_SPECIAL_TOKENS_RE = re.compile(r"</s>|<\|endoftext\|>")
+
+
 class TextGenerationTools:
     """Collection of text generation tools for MCP"""
     
+    _tool_definitions: Optional[Tuple[ToolDefinition, ...]] = None
+    
     def __init__(self, kobold_client: KoboldCppClient):
         self.client = kobold_client
         self.logger = logging.getLogger(__name__)
         self.settings = get_settings()
+        # Sanitization is fixed for the process lifetime, so the prompt filter
+        # is chosen once rather than checked on every call
+        self._sanitize: Callable[[str], str] = (
+            self._sanitize_prompt if self.settings.security.data_sanitization
+            else lambda prompt: prompt
+        )
     
     def get_tool_definitions(self) -> List[ToolDefinition]:
         """Get all tool definitions for MCP registration"""
-        return [
-            self._get_generate_tool_definition(),
-            self._get_chat_tool_definition(),
-            self._get_prompt_test_tool_definition(),
-            self._get_batch_generate_tool_definition(),
-        ]
+        # The schemas are constant and the models frozen, so they are built
+        # once and shared by every instance
+        cls = type(self)
+        if cls._tool_definitions is None:
+            cls._tool_definitions = (
+                self._get_generate_tool_definition(),
+                self._get_chat_tool_definition(),
+                self._get_prompt_test_tool_definition(),
+                self._get_batch_generate_tool_definition(),
+            )
+        return list(cls._tool_definitions)
     
     def _get_generate_tool_definition(self) -> ToolDefinition:
         """Tool definition for text generation"""
@@ -101,6 +119,11 @@ class TextGenerationTools:
                         "items": {"type": "string"},
                         "description": "List of strings that will stop generation",
                         "default": []
+                    },
+                    "include_params": {
+                        "type": "boolean",
+                        "description": "Echo the resolved generation parameters in the result metadata",
+                        "default": False
                     }
                 },
                 "required": ["prompt"]
@@ -154,6 +177,10 @@ class TextGenerationTools:
                         "default": 0.9,
                         "minimum": 0.0,
                         "maximum": 1.0
+                    },
+                    "conversation_id": {
+                        "type": "string",
+                        "description": "Opaque label for the conversation, forwarded as the OpenAI user field; it does not affect caching. KoboldCpp reuses its prompt cache when each turn resends the earlier messages unchanged with new ones appended"
                     }
                 },
                 "required": ["messages"]
@@ -190,6 +217,13 @@ class TextGenerationTools:
                         "default": 50,
                         "minimum": 1,
                         "maximum": 1024
+                    },
+                    "max_concurrent": {
+                        "type": "integer",
+                        "description": "Maximum concurrent requests",
+                        "default": 3,
+                        "minimum": 1,
+                        "maximum": 10
                     }
                 },
                 "required": ["prompt"]
@@ -246,21 +280,24 @@ class TextGenerationTools:
         rep_pen: float = 1.1,
         rep_pen_range: int = 320,
         stop_sequence: Optional[List[str]] = None,
+        include_params: bool = False,
+        on_chunk: Optional[Callable[[GenerationChunk], Awaitable[None]]] = None,
         **kwargs
     ) -> Dict[str, Any]:
-        """Generate text using KoboldCpp"""
+        """Generate text using KoboldCpp; streams through on_chunk when given"""
+        
+        security = self.settings.security
         
         # Validate and sanitize input
-        if self.settings.security.data_sanitization:
-            prompt = self._sanitize_prompt(prompt)
+        prompt = self._sanitize(prompt)
         
-        if len(prompt) > self.settings.security.max_prompt_length:
-            raise ValueError(f"Prompt exceeds maximum length of {self.settings.security.max_prompt_length}")
+        if len(prompt) > security.max_prompt_length:
+            raise ValueError(f"Prompt exceeds maximum length of {security.max_prompt_length}")
         
         try:
             params = GenerateTextParams(
                 prompt=prompt,
-                max_tokens=min(max_tokens, self.settings.security.max_response_length),
+                max_tokens=min(max_tokens, security.max_response_length),
                 temperature=temperature,
                 top_p=top_p,
                 top_k=top_k,
@@ -270,22 +307,30 @@ class TextGenerationTools:
                 stop_sequence=stop_sequence or []
             )
             
-            result = await self.client.generate_text(params)
+            if on_chunk is not None:
+                result = await self.client.generate_text_streamed(params, on_chunk)
+            else:
+                result = await self.client.generate_text(params)
+            
+            metadata = {
+                "tokens_generated": result.tokens_generated,
+                "generation_time": result.generation_time,
+                "tokens_per_second": result.tokens_per_second,
+                "finish_reason": result.finish_reason
+            }
+            # Echoing the parameters repeats the whole prompt back to the
+            # caller, so it is only done on request
+            if include_params:
+                metadata["parameters_used"] = params.model_dump()
             
             return {
                 "type": "text",
                 "text": result.text,
-                "metadata": {
-                    "tokens_generated": result.tokens_generated,
-                    "generation_time": result.generation_time,
-                    "tokens_per_second": result.tokens_per_second,
-                    "finish_reason": result.finish_reason,
-                    "parameters_used": params.model_dump()
-                }
+                "metadata": metadata
             }
         
         except Exception as e:
-            self.logger.error(f"Text generation failed: {e}")
+            self.logger.error("Text generation failed: %s", e)
             raise
     
     async def chat_completion(
@@ -294,29 +339,27 @@ class TextGenerationTools:
         max_tokens: int = 100,
         temperature: float = 0.7,
         top_p: float = 0.9,
+        conversation_id: Optional[str] = None,
         **kwargs
     ) -> Dict[str, Any]:
         """Generate chat completion"""
         
+        security = self.settings.security
+        sanitize = self._sanitize
+        
         try:
             # Convert message format
-            chat_messages = []
-            for msg in messages:
-                if self.settings.security.data_sanitization:
-                    content = self._sanitize_prompt(msg["content"])
-                else:
-                    content = msg["content"]
-                
-                chat_messages.append(ChatMessage(
-                    role=msg["role"],
-                    content=content
-                ))
+            chat_messages = [
+                ChatMessage(role=msg["role"], content=sanitize(msg["content"]))
+                for msg in messages
+            ]
             
             params = ChatCompletionParams(
                 messages=chat_messages,
-                max_tokens=min(max_tokens, self.settings.security.max_response_length),
+                max_tokens=min(max_tokens, security.max_response_length),
                 temperature=temperature,
-                top_p=top_p
+                top_p=top_p,
+                conversation_id=conversation_id
             )
             
             result = await self.client.chat_completion(params)
@@ -334,7 +377,7 @@ class TextGenerationTools:
             }
         
         except Exception as e:
-            self.logger.error(f"Chat completion failed: {e}")
+            self.logger.error("Chat completion failed: %s", e)
             raise
     
     async def test_prompt(
@@ -343,6 +386,7 @@ class TextGenerationTools:
         temperature_range: List[float] = None,
         top_p_range: List[float] = None,
         max_tokens: int = 50,
+        max_concurrent: int = 3,
         **kwargs
     ) -> Dict[str, Any]:
         """Test prompt with multiple parameter variations"""
@@ -350,28 +394,46 @@ class TextGenerationTools:
         temperature_range = temperature_range or [0.3, 0.7, 1.0]
         top_p_range = top_p_range or [0.8, 0.9, 0.95]
         
-        results = []
-        
         try:
-            for temp in temperature_range:
-                for top_p in top_p_range:
-                    params = GenerateTextParams(
-                        prompt=prompt,
-                        max_tokens=max_tokens,
-                        temperature=temp,
-                        top_p=top_p
-                    )
-                    
-                    result = await self.client.generate_text(params)
-                    
-                    results.append({
-                        "temperature": temp,
-                        "top_p": top_p,
-                        "generated_text": result.text,
-                        "tokens_generated": result.tokens_generated,
-                        "generation_time": result.generation_time,
-                        "tokens_per_second": result.tokens_per_second
-                    })
+            # Validate the shared fields once; each grid cell is a shallow copy
+            # that only swaps in its sampling values, coerced here since
+            # model_copy does not re-validate
+            base_params = GenerateTextParams(prompt=prompt, max_tokens=max_tokens)
+            params_list = [
+                base_params.model_copy(update={"temperature": temp, "top_p": top_p})
+                for temp, top_p in product(map(float, temperature_range), map(float, top_p_range))
+            ]
+            
+            # Run the grid concurrently, capped per call so one large grid
+            # cannot take every client slot from other tool calls
+            semaphore = asyncio.Semaphore(
+                max(1, min(max_concurrent, self.settings.performance.max_concurrent_requests))
+            )
+            
+            async def run(params: GenerateTextParams) -> GenerationResult:
+                async with semaphore:
+                    return await self.client.generate_text(params)
+            
+            tasks = [asyncio.ensure_future(run(params)) for params in params_list]
+            try:
+                generation_results = await asyncio.gather(*tasks)
+            finally:
+                # If one cell failed, stop the rest instead of leaving them
+                # running with nobody waiting on their results
+                for task in tasks:
+                    task.cancel()
+            
+            results = [
+                {
+                    "temperature": params.temperature,
+                    "top_p": params.top_p,
+                    "generated_text": result.text,
+                    "tokens_generated": result.tokens_generated,
+                    "generation_time": result.generation_time,
+                    "tokens_per_second": result.tokens_per_second
+                }
+                for params, result in zip(params_list, generation_results)
+            ]
             
             # Find best result based on tokens per second and length
             best_result = max(results, key=lambda x: x["tokens_per_second"])
@@ -391,7 +453,7 @@ class TextGenerationTools:
             }
         
         except Exception as e:
-            self.logger.error(f"Prompt testing failed: {e}")
+            self.logger.error("Prompt testing failed: %s", e)
             raise
     
     async def batch_generate(
@@ -404,38 +466,37 @@ class TextGenerationTools:
     ) -> Dict[str, Any]:
         """Generate text for multiple prompts in batch"""
         
-        if len(prompts) > 50:  # Reasonable limit for batch processing
-            raise ValueError("Too many prompts in batch (maximum 50)")
-        
         try:
-            # Sanitize prompts if enabled
-            if self.settings.security.data_sanitization:
-                prompts = [self._sanitize_prompt(p) for p in prompts]
-            
-            params = GenerateTextParams(
-                prompt="",  # Will be overridden for each prompt
-                max_tokens=min(max_tokens, self.settings.security.max_response_length),
-                temperature=temperature
-            )
+            batch_request = self._build_batch_request(prompts, max_tokens, temperature, max_concurrent)
             
-            batch_request = BatchRequest(
-                prompts=prompts,
-                parameters=params,
-                max_concurrent=min(max_concurrent, self.settings.performance.max_concurrent_requests)
-            )
+            # Greedy decoding (temperature 0) gives the same text for the same
+            # prompt, so repeated prompts are generated once and the result is
+            # shared; with sampling, repeats are independent draws and all run
+            unique_prompts: List[str] = []
+            if batch_request.parameters.temperature <= 0:
+                unique_prompts = list(dict.fromkeys(batch_request.prompts))
             
-            batch_result = await self.client.batch_generate(batch_request)
+            if unique_prompts and len(unique_prompts) < len(batch_request.prompts):
+                unique_result = await self.client.batch_generate(
+                    batch_request.model_copy(update={"prompts": unique_prompts})
+                )
+                result_for_prompt = dict(zip(unique_prompts, unique_result.results))
+                results = [result_for_prompt[prompt] for prompt in batch_request.prompts]
+                successful = sum(result.finish_reason != "error" for result in results)
+                batch_result = BatchResult(
+                    results=results,
+                    total_time=unique_result.total_time,
+                    successful=successful,
+                    failed=len(results) - successful
+                )
+            else:
+                batch_result = await self.client.batch_generate(batch_request)
             
             # Format results
-            formatted_results = []
-            for i, result in enumerate(batch_result.results):
-                formatted_results.append({
-                    "prompt_index": i,
-                    "generated_text": result.text,
-                    "tokens_generated": result.tokens_generated,
-                    "generation_time": result.generation_time,
-                    "success": result.finish_reason != "error"
-                })
+            formatted_results = [
+                self._format_batch_result(i, result)
+                for i, result in enumerate(batch_result.results)
+            ]
             
             return {
                 "type": "text",
@@ -450,13 +511,69 @@ class TextGenerationTools:
             }
         
         except Exception as e:
-            self.logger.error(f"Batch generation failed: {e}")
+            self.logger.error("Batch generation failed: %s", e)
             raise
     
+    async def batch_generate_stream(
+        self,
+        prompts: List[str],
+        max_tokens: int = 100,
+        temperature: float = 0.7,
+        max_concurrent: int = 3,
+        **kwargs
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Yield each batch result as soon as its generation completes
+        
+        Takes the same arguments as batch_generate. Results arrive in
+        completion order, so each carries its prompt_index.
+        """
+        batch_request = self._build_batch_request(prompts, max_tokens, temperature, max_concurrent)
+        async for index, result in self.client.batch_generate_iter(batch_request):
+            yield self._format_batch_result(index, result)
+    
+    def _build_batch_request(
+        self, prompts: List[str], max_tokens: int, temperature: float, max_concurrent: int
+    ) -> BatchRequest:
+        """Validate, sanitize and clamp batch arguments into a BatchRequest"""
+        if len(prompts) > 50:  # Reasonable limit for batch processing
+            raise ValueError("Too many prompts in batch (maximum 50)")
+        
+        security = self.settings.security
+        
+        # Sanitize prompts if enabled
+        sanitize = self._sanitize
+        prompts = [sanitize(p) for p in prompts]
+        
+        params = GenerateTextParams(
+            prompt="",  # Will be overridden for each prompt
+            max_tokens=min(max_tokens, security.max_response_length),
+            temperature=temperature
+        )
+        
+        return BatchRequest(
+            prompts=prompts,
+            parameters=params,
+            max_concurrent=min(max_concurrent, self.settings.performance.max_concurrent_requests)
+        )
+    
+    @staticmethod
+    def _format_batch_result(index: int, result: GenerationResult) -> Dict[str, Any]:
+        """Format one batch generation result for tool output"""
+        return {
+            "prompt_index": index,
+            "generated_text": result.text,
+            "tokens_generated": result.tokens_generated,
+            "generation_time": result.generation_time,
+            "success": result.finish_reason != "error"
+        }
+    
     def _sanitize_prompt(self, prompt: str) -> str:
         """Sanitize prompt for security and compliance"""
-        # Remove potential injection patterns
-        sanitized = prompt.replace("</s>", "").replace("<|endoftext|>", "")
+        # Remove potential injection patterns, repeating while a removal
+        # splices a new token together (e.g. "<|endof</s>text|>")
+        sanitized, removed = _SPECIAL_TOKENS_RE.subn("", prompt)
+        while removed:
+            sanitized, removed = _SPECIAL_TOKENS_RE.subn("", sanitized)
         
         # Truncate if too long
         max_length = self.settings.security.max_prompt_length
@@ -0,0 +1,110 @@
+"""Tests for the KoboldCpp client's stream parsing and retry helpers"""
+
+from typing import AsyncGenerator, List
+
+import pytest
+
+from koboldcpp_mcp_server.kobold_client import _RetryController, _iter_json_objects
+
+
+class FakeStreamReader:
+    """Stands in for aiohttp.StreamReader, replaying fixed body chunks"""
+    
+    def __init__(self, *chunks: bytes) -> None:
+        self.chunks = chunks
+    
+    async def iter_chunked(self, n: int) -> AsyncGenerator[bytes, None]:
+        for chunk in self.chunks:
+            yield chunk
+
+
+async def collect(*chunks: bytes) -> List[bytes]:
+    return [obj async for obj in _iter_json_objects(FakeStreamReader(*chunks))]
+
+
+async def test_objects_in_one_chunk():
+    assert await collect(b'{"a": 1}{"b": 2}\n{"c": {"d": 3}}') == [
+        b'{"a": 1}', b'{"b": 2}', b'{"c": {"d": 3}}'
+    ]
+
+
+@pytest.mark.parametrize("split", range(1, 24))
+async def test_object_split_across_chunks(split):
+    body = b'{"token": "x", "n": {}}{"token": "y"}'
+    assert await collect(body[:split], body[split:]) == [
+        b'{"token": "x", "n": {}}', b'{"token": "y"}'
+    ]
+
+
+async def test_object_split_one_byte_per_chunk():
+    body = b'{"text": "a\\"}b", "n": 1}'
+    assert await collect(*(body[i:i + 1] for i in range(len(body)))) == [body]
+
+
+async def test_braces_inside_strings_are_ignored():
+    body = b'{"text": "} { }}", "more": "{"}'
+    assert await collect(body) == [body]
+
+
+async def test_escaped_quotes_and_backslashes_in_strings():
+    first = b'{"text": "say \\"}\\" now"}'
+    second = b'{"text": "ends in backslash \\\\"}'
+    assert await collect(first + second) == [first, second]
+
+
+async def test_escape_split_from_escaped_character():
+    body = b'{"text": "a\\"}"}'
+    split = body.index(b"\\") + 1
+    assert await collect(body[:split], body[split:]) == [body]
+
+
+async def test_sse_data_framing():
+    body = (
+        b'event: message\n'
+        b'data: {"token": "Hel"}\n\n'
+        b'data: {"token": "lo"}\n\n'
+        b': keep-alive\n\n'
+        b'data: [DONE]\n\n'
+    )
+    assert await collect(body[:20], body[20:]) == [b'{"token": "Hel"}', b'{"token": "lo"}']
+
+
+async def test_trailing_partial_object_is_dropped():
+    assert await collect(b'{"a": 1}{"b": ', b'"unterminated') == [b'{"a": 1}']
+
+
+async def test_empty_body():
+    assert await collect() == []
+
+
+def test_retry_delay_floor_grows_with_attempt():
+    retry = _RetryController(base_delay=1.0, max_delay=30.0)
+    assert [retry.delay(attempt) for attempt in range(3)] == [1.0, 2.0, 3.0]
+
+
+def test_retry_delay_grows_with_failure_rate():
+    retry = _RetryController(base_delay=1.0, max_delay=30.0, smoothing=0.5)
+    delays = []
+    for _ in range(4):
+        retry.record(False)
+        delays.append(retry.delay(0))
+    # p = 0.5, 0.75, 0.875, 0.9375 gives base * p / (1 - p)
+    assert delays == pytest.approx([1.0, 3.0, 7.0, 15.0])
+
+
+def test_retry_delay_recovers_after_successes():
+    retry = _RetryController(base_delay=1.0, max_delay=30.0, smoothing=0.5)
+    for _ in range(4):
+        retry.record(False)
+    for _ in range(4):
+        retry.record(True)
+    assert retry.failure_rate == pytest.approx(0.9375 / 16)
+    assert retry.delay(0) == 1.0
+
+
+def test_retry_delay_is_capped():
+    retry = _RetryController(base_delay=1.0, max_delay=5.0)
+    assert retry.delay(10) == 5.0
+    for _ in range(50):
+        retry.record(False)
+    assert retry.delay(0) == 5.0
@@ -0,0 +1,56 @@
+"""Tests for MCP request validation and JSON-RPC error mapping"""
+
+import pytest
+
+from koboldcpp_mcp_server.protocol.mcp_handler import ConnectionState, MCPHandler
+
+
+@pytest.fixture
+def handler():
+    return MCPHandler()
+
+
+async def dispatch(handler, data):
+    state = ConnectionState(None)
+    state.initialized = True
+    return await handler._dispatch(None, data, state)
+
+
+async def test_unknown_method_is_method_not_found(handler):
+    response = await dispatch(handler, {"jsonrpc": "2.0", "id": 1, "method": "bogus/method"})
+    assert response.id == 1
+    assert response.error.code == -32601
+    assert "bogus/method" in response.error.message
+
+
+async def test_bad_params_are_invalid_params(handler):
+    response = await dispatch(handler, {
+        "jsonrpc": "2.0", "id": 2, "method": "tools/call", "params": {"arguments": {}}
+    })
+    assert response.id == 2
+    assert response.error.code == -32602
+    assert "name" in response.error.message
+
+
+async def test_missing_initialize_params_are_invalid_params(handler):
+    response = await dispatch(handler, {"jsonrpc": "2.0", "id": 3, "method": "initialize"})
+    assert response.id == 3
+    assert response.error.code == -32602
+
+
+async def test_bad_id_is_invalid_request(handler):
+    response = await dispatch(handler, {"jsonrpc": "2.0", "id": [4], "method": "tools/list"})
+    assert response.id is None
+    assert response.error.code == -32600
+
+
+async def test_non_object_message_is_invalid_request(handler):
+    response = await dispatch(handler, [1, 2])
+    assert response.id is None
+    assert response.error.code == -32600
+
+
+async def test_valid_request_passes_validation(handler):
+    response = await dispatch(handler, {"jsonrpc": "2.0", "id": 5, "method": "tools/list"})
+    assert b'"id":5' in response
+    assert b'"error"' not in response